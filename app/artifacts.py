@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from playwright.async_api import Page
+from app.config import config
+from app.models import FailureReason
+from app.logger import logger
+
+# Parts of a page that differ between otherwise identical failure pages
+VOLATILE_HTML_RE = re.compile(r"<script\b.*?</script>|<style\b.*?</style>|\d+", re.DOTALL | re.IGNORECASE)
+
+class ArtifactWriter:
+    """
+    Writes debug artifacts from a background task so failures never block the
+    event loop on disk I/O. The queue is bounded (overflow is dropped), captures
+    are sampled per failure reason, identical failure pages are stored once,
+    HTML is gzipped, and the oldest files are evicted beyond ARTIFACT_MAX_MB.
+    """
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        # fingerprint -> path of the stored copy, and back, so evicted files are forgotten
+        self.seen: "OrderedDict[str, str]" = OrderedDict()
+        self.fingerprints: Dict[str, str] = {}
+        self.files: Optional[List[Tuple[float, str, int]]] = None
+        self.total_bytes = 0
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.duplicates = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def should_capture(self, request_id: str, name: str, reason: Optional[FailureReason]) -> bool:
+        rate = config.ARTIFACT_SAMPLE_RATES.get(reason.value if reason else "", config.ARTIFACT_SAMPLE_RATE)
+        # Hashing instead of random() keeps or drops the screenshot and HTML of one failure together
+        draw = int(hashlib.sha256(f"{request_id}:{name}".encode("utf-8")).hexdigest()[:8], 16) / 2**32
+        if draw < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def submit(self, request_id: str, path: str, data: bytes, html: bool = False):
+        """Queues an artifact; hashing, compression and writing happen in a worker thread."""
+        if self._task is None or self._task.done():
+            self.queue = asyncio.Queue(maxsize=config.ARTIFACT_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._write_loop())
+        try:
+            self.queue.put_nowait((request_id, path, data, html))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Artifact queue full, dropping capture", extra={"request_id": request_id})
+
+    async def _write_loop(self):
+        while True:
+            request_id, path, data, html = await self.queue.get()
+            try:
+                duplicate_of = await asyncio.to_thread(self._store, path, data, html)
+                if duplicate_of:
+                    self.duplicates += 1
+                    logger.info("Artifact identical to %s, not stored again", duplicate_of, extra={"request_id": request_id})
+                else:
+                    self.written += 1
+                    logger.info("Artifact saved to %s", path, extra={"request_id": request_id})
+            except Exception as e:
+                logger.error("Failed to save artifact: %s", e, extra={"request_id": request_id})
+
+    def _store(self, path: str, data: bytes, html: bool) -> Optional[str]:
+        """Writes the artifact unless an identical one exists; returns that one's path if so."""
+        if html:
+            fingerprint = hashlib.sha256(VOLATILE_HTML_RE.sub("", data.decode("utf-8", errors="ignore")).encode("utf-8")).hexdigest()
+        else:
+            fingerprint = hashlib.sha256(data).hexdigest()
+        if fingerprint in self.seen:
+            self.seen.move_to_end(fingerprint)
+            return self.seen[fingerprint]
+        self._write(path, gzip.compress(data, compresslevel=6) if html else data)
+        self.seen[fingerprint] = path
+        self.fingerprints[path] = fingerprint
+        while len(self.seen) > config.ARTIFACT_DEDUP_ENTRIES:
+            _, old_path = self.seen.popitem(last=False)
+            self.fingerprints.pop(old_path, None)
+        return None
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        files = []
+        for directory in (config.SCREENSHOT_DIR, config.HTML_SNAPSHOT_DIR):
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.path, stat.st_size))
+        files.sort()
+        return files
+
+    def _write(self, path: str, data: bytes):
+        if self.files is None:
+            self.files = self._scan()
+            self.total_bytes = sum(size for _, _, size in self.files)
+
+        with open(path, "wb") as f:
+            f.write(data)
+        self.files.append((time.time(), path, len(data)))
+        self.total_bytes += len(data)
+
+        # Oldest first
+        while self.total_bytes > config.ARTIFACT_MAX_MB * 2**20 and len(self.files) > 1:
+            _, old_path, size = self.files.pop(0)
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+            self.total_bytes -= size
+            fingerprint = self.fingerprints.pop(old_path, None)
+            if fingerprint:
+                del self.seen[fingerprint]
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "duplicates": self.duplicates,
+            "bytes": self.total_bytes,
+        }
+
+artifact_writer = ArtifactWriter()
+
+async def take_screenshot(page: Page, request_id: str, name: str, reason: Optional[FailureReason] = None):
+    if page and artifact_writer.should_capture(request_id, name, reason):
+        try:
+            data = await page.screenshot(type="jpeg", quality=config.ARTIFACT_SCREENSHOT_QUALITY, timeout=config.ARTIFACT_CAPTURE_TIMEOUT * 1000)
+            artifact_writer.submit(request_id, f"{config.SCREENSHOT_DIR}/{request_id}_{name}.jpg", data)
+        except Exception as e:
+            logger.error("Failed to take screenshot: %s", e, extra={"request_id": request_id})
+
+async def dump_html(page: Page, request_id: str, name: str, reason: Optional[FailureReason] = None):
+    if page and artifact_writer.should_capture(request_id, name, reason):
+        try:
+            content = await page.content()
+            artifact_writer.submit(request_id, f"{config.HTML_SNAPSHOT_DIR}/{request_id}_{name}.html.gz", content.encode("utf-8"), html=True)
+        except Exception as e:
+            logger.error("Failed to save HTML snapshot: %s", e, extra={"request_id": request_id})
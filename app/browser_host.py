@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import json
+import os
+from typing import Dict
+from app.config import config
+from app.models import GenerateRequest
+from app.logger import logger
+from app.browser_pool import browser_pool
+from app.page_pool import page_pool
+from app.browser_service import BrowserService
+from app.profiler import profiler
+
+class BrowserHost:
+    """
+    A browser-host process: owns its own browser and page pools and runs the
+    jobs the dispatcher sends it over a Unix socket. Messages are JSON lines;
+    the dispatcher sends {"op": "generate" | "cancel", ...} and the host answers
+    with {"job_id", "event": "chunk" | "reset" | "done", ...}.
+    """
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.closed = asyncio.Event()
+
+    async def serve(self):
+        profiler.start()
+        await browser_pool.start()
+        await page_pool.start()
+        # Listening only once the pools are up tells the dispatcher the host is ready
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=config.BROWSER_HOST_MESSAGE_LIMIT)
+        logger.info("Browser host ready", extra={"props": {"socket": self.socket_path}})
+        try:
+            await self.closed.wait()
+        finally:
+            server.close()
+            for task in self.tasks.values():
+                task.cancel()
+            await page_pool.stop()
+            await browser_pool.stop()
+            profiler.stop()
+            if profiler.installed:
+                # /debug/profile only sees the API process; each host leaves its own dump
+                logger.info("Wrote host profile to %s", profiler.dump(f"host-{os.getpid()}"))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        def send(message: dict):
+            if not writer.is_closing():
+                writer.write(json.dumps(message).encode() + b"\n")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                job_id = message["job_id"]
+                if message["op"] == "generate":
+                    request = GenerateRequest.model_validate(message["request"])
+                    task = asyncio.create_task(self._generate(job_id, request, send))
+                    self.tasks[job_id] = task
+                    task.add_done_callback(lambda _, job_id=job_id: self.tasks.pop(job_id, None))
+                elif message["op"] == "cancel" and job_id in self.tasks:
+                    self.tasks[job_id].cancel()
+        except Exception as e:
+            logger.error("Browser host connection error: %s", e)
+        finally:
+            # The dispatcher went away; nobody is left to answer
+            logger.info("Dispatcher disconnected, stopping browser host")
+            self.closed.set()
+
+    async def _generate(self, job_id: str, request: GenerateRequest, send):
+        def on_text(text: str, reset: bool):
+            send({"job_id": job_id, "event": "reset" if reset else "chunk", "text": text})
+
+        service = BrowserService(job_id, on_text=on_text)
+        result = await service.process_request(request)
+        send({"job_id": job_id, "event": "done", "result": result.model_dump(mode="json")})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a browser host for the dispatcher")
+    parser.add_argument("--socket", required=True, help="Unix socket path to listen on")
+    args = parser.parse_args()
+    asyncio.run(BrowserHost(args.socket).serve())
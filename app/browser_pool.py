@@ -0,0 +1,220 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Set
+from playwright.async_api import async_playwright, Browser, Playwright
+from app.config import config
+from app.logger import logger
+from app.memory import chromium_root_pids, process_tree_memory
+
+# Browser launch arguments for stealth
+BROWSER_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-infobars",
+    "--window-position=0,0",
+    "--ignore-certifcate-errors",
+    "--ignore-certifcate-errors-spki-list",
+    "--disable-accelerated-2d-canvas",
+    "--no-zygote",
+    "--no-first-run",
+    "--disable-dev-shm-usage",
+]
+
+class BrowserPool:
+    """
+    Long-lived pool of Chromium instances driven by a single Playwright driver.
+    Each browser hosts up to `contexts_per_browser` isolated contexts; a lease is
+    one context slot, placed on the least-loaded browser. Crashed browsers are replaced,
+    and browsers are recycled after BROWSER_MAX_LEASES leases or once their memory
+    crosses BROWSER_MAX_RSS_MB, to bound Chromium's memory growth.
+    """
+    def __init__(self, size: int = config.MAX_CONCURRENT_BROWSERS, contexts_per_browser: int = config.CONTEXTS_PER_BROWSER):
+        self.size = size
+        self.contexts_per_browser = contexts_per_browser
+        self.capacity = size * contexts_per_browser
+        self.playwright: Optional[Playwright] = None
+        self.browsers: List[Browser] = []
+        self.load: Dict[Browser, int] = {}
+        self.leases: Dict[Browser, int] = {}
+        self.pids: Dict[Browser, int] = {}
+        # Browsers that take no new leases and are replaced once their last context closes
+        self.retiring: Set[Browser] = set()
+        self.recycled = 0
+        self.missing = 0
+        self.available = asyncio.Condition()
+        self._launch_lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        logger.info("Starting browser pool", extra={"props": {"pool_size": self.size, "contexts_per_browser": self.contexts_per_browser}})
+        self.playwright = await async_playwright().start()
+        for _ in range(self.size):
+            try:
+                await self._launch()
+            except Exception as e:
+                logger.error("Failed to launch pooled browser: %s", e)
+                self.missing += 1
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        logger.info("Stopping browser pool")
+        if self._health_task:
+            self._health_task.cancel()
+        for browser in list(self.browsers):
+            self._forget(browser)
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.error("Error closing pooled browser: %s", e)
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+    async def _launch(self) -> Browser:
+        # Launches are serialized so the new Chromium process can be told apart by its pid
+        async with self._launch_lock:
+            before = chromium_root_pids(os.getpid())
+            browser = await self.playwright.chromium.launch(
+                # If you comment this and uncomment this you will be able to see the browser in action
+                #headless=False,
+                headless=config.BROWSER_HEADLESS,
+                args=BROWSER_ARGS
+            )
+            new_pids = chromium_root_pids(os.getpid()) - before
+        browser.on("disconnected", lambda _: asyncio.create_task(self._on_disconnected(browser)))
+        async with self.available:
+            self.browsers.append(browser)
+            self.load[browser] = 0
+            self.leases[browser] = 0
+            if len(new_pids) == 1:
+                self.pids[browser] = new_pids.pop()
+            self.available.notify_all()
+        if browser not in self.pids:
+            # Without a pid browser_memory() reads 0, so BROWSER_MAX_RSS_MB never recycles this browser
+            logger.warning("Could not identify the pooled browser's process; its memory is not tracked", extra={"props": {"new_pids": sorted(new_pids)}})
+        logger.info("Launched pooled browser", extra={"props": {"browser_count": len(self.browsers)}})
+        return browser
+
+    def _forget(self, browser: Browser) -> bool:
+        if browser not in self.load:
+            return False
+        self.browsers.remove(browser)
+        del self.load[browser]
+        del self.leases[browser]
+        self.pids.pop(browser, None)
+        self.retiring.discard(browser)
+        return True
+
+    async def _replace(self, browser: Browser):
+        if not self._forget(browser):
+            return
+        try:
+            await browser.close()
+        except Exception:
+            pass
+        try:
+            await self._launch()
+        except Exception as e:
+            logger.error("Failed to replace pooled browser: %s", e)
+            self.missing += 1
+
+    async def _on_disconnected(self, browser: Browser):
+        if browser in self.load and self.playwright:
+            logger.warning("Pooled browser disconnected, replacing", extra={"props": {"contexts_lost": self.load[browser]}})
+            await self._replace(browser)
+
+    async def _is_healthy(self, browser: Browser) -> bool:
+        if not browser.is_connected():
+            return False
+        try:
+            # A CDP round trip proves the browser process is still responsive
+            session = await asyncio.wait_for(browser.new_browser_cdp_session(), timeout=config.BROWSER_HEALTH_CHECK_TIMEOUT)
+            await session.detach()
+            return True
+        except Exception:
+            return False
+
+    def _least_loaded(self) -> Optional[Browser]:
+        candidates = [
+            b for b in self.browsers
+            if self.load[b] < self.contexts_per_browser and b.is_connected() and b not in self.retiring
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: self.load[b])
+
+    async def acquire(self) -> Browser:
+        """Reserve a context slot on the least-loaded healthy browser."""
+        async with self.available:
+            while True:
+                browser = self._least_loaded()
+                if browser:
+                    self.load[browser] += 1
+                    self.leases[browser] += 1
+                    if self.leases[browser] >= config.BROWSER_MAX_LEASES:
+                        self._retire(browser, "lease limit reached")
+                    return browser
+                await self.available.wait()
+
+    async def release(self, browser: Browser):
+        async with self.available:
+            # Slots on a browser that was already replaced are simply dropped
+            if browser in self.load:
+                self.load[browser] -= 1
+            self.available.notify()
+        if browser in self.retiring and self.load.get(browser) == 0:
+            asyncio.create_task(self._recycle(browser))
+
+    def is_retiring(self, browser: Browser) -> bool:
+        return browser in self.retiring
+
+    def _retire(self, browser: Browser, reason: str):
+        if browser not in self.retiring:
+            logger.info("Retiring pooled browser: %s", reason, extra={"props": {"leases": self.leases.get(browser)}})
+            self.retiring.add(browser)
+
+    async def _recycle(self, browser: Browser):
+        if browser in self.retiring and self.load.get(browser) == 0:
+            self.recycled += 1
+            await self._replace(browser)
+
+    def browser_memory(self, browser: Browser) -> int:
+        pid = self.pids.get(browser)
+        return process_tree_memory(pid) if pid else 0
+
+    def stats(self) -> dict:
+        return {
+            "browsers": len(self.browsers),
+            "contexts_per_browser": self.contexts_per_browser,
+            "contexts_in_use": sum(self.load.values()),
+            "capacity": self.capacity,
+            "retiring": len(self.retiring),
+            "recycled": self.recycled,
+            "untracked_memory": sum(1 for browser in self.browsers if browser not in self.pids),
+        }
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(config.BROWSER_HEALTH_CHECK_INTERVAL)
+            try:
+                # Only browsers without open contexts are probed; busy ones are watched via "disconnected"
+                for browser in [b for b in self.browsers if self.load[b] == 0]:
+                    if not await self._is_healthy(browser):
+                        logger.warning("Pooled browser failed health check, replacing")
+                        await self._replace(browser)
+
+                for browser in list(self.browsers):
+                    memory = await asyncio.to_thread(self.browser_memory, browser)
+                    if memory > config.BROWSER_MAX_RSS_MB * 2**20:
+                        self._retire(browser, f"memory {memory // 2**20} MB over limit")
+                    if browser in self.retiring:
+                        await self._recycle(browser)
+
+                while self.missing > 0:
+                    await self._launch()
+                    self.missing -= 1
+            except Exception as e:
+                logger.error("Browser pool health check error: %s", e)
+
+browser_pool = BrowserPool(config.MAX_CONCURRENT_BROWSERS, config.CONTEXTS_PER_BROWSER)
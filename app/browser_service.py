@@ -1,315 +1,329 @@
 import asyncio
 import time
-import traceback
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page
-from playwright_stealth import stealth_async
+from typing import Callable, Dict, Optional
+from playwright.async_api import BrowserContext, Page
 from app.config import config
 from app.models import GenerateRequest, GenerateResponse, TaskStatus, FailureReason
 from app.logger import logger
-from app.dom_observer import DOMObserver
+from app.dom_observer import DOMObserver, ChunkBuffer
+from app.page_pool import page_pool, new_chat, HotPage, PagePreparationError
+from app.page_probe import probe_page, wait_send_enabled
+from app.prompt_input import enter_prompt
+from app.artifacts import take_screenshot, dump_html
+from app.metrics import metrics
+from app.profiler import profiler
+from app.latency_history import latency_history
 
 class BrowserService:
-    def __init__(self, request_id: str):
+    def __init__(self, request_id: str, on_text: Optional[Callable[[str, bool], None]] = None, hot_page: Optional[HotPage] = None):
         self.request_id = request_id
-        self.playwright = None
-        self.browser: Optional[Browser] = None
+        # Receives (text, reset): appended text, or the full text when it was replaced
+        self.on_text = on_text
+        # Set when continuing on the page of a previous prompt
+        self.hot_page: Optional[HotPage] = hot_page
+        self.completed = False
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.observer: Optional[DOMObserver] = None
-        self.accumulated_text = ""
+        self.buffer = ChunkBuffer()
+        self.generation_started = asyncio.Event()
         self.generation_done = asyncio.Event()
+        # Assistant messages already on the page before this prompt was sent
+        self.previous_messages = 0
         self.start_time = time.time()
+        # Milliseconds per stage, in the order the stages finished
+        self.timings: Dict[str, int] = {}
+        self._stage_start = time.perf_counter()
+        # Set when this request is recorded as a Playwright trace
+        self.tracing = False
+        self._last_chunk_at: Optional[float] = None
+        # Page network counters when this request took the page
+        self._network_start: Optional[Dict[str, int]] = None
 
-    async def _cleanup(self):
+    def _mark(self, stage: str):
+        """Ends the current stage and starts the next one."""
+        now = time.perf_counter()
+        elapsed = now - self._stage_start
+        self.timings[stage] = int(elapsed * 1000)
+        metrics.stage_seconds.observe(elapsed, stage)
+        latency_history.observe(stage, elapsed)
+        self._stage_start = now
+
+    def _snapshot_network(self):
+        if self.hot_page.network:
+            self._network_start = self.hot_page.network.as_dict()
+
+    @property
+    def accumulated_text(self) -> str:
+        return self.buffer.text
+
+    async def _cleanup(self, keep_page: bool = False):
         """Force cleanup of all resources"""
+        if self.tracing:
+            await profiler.stop_trace(self.hot_page, self.request_id)
+        if self.observer:
+            logger.info("Observer bridge stats", extra={"request_id": self.request_id, "props": self.observer.stats()})
+        if self.hot_page and self.hot_page.network and self._network_start is not None:
+            # Only this request's traffic, not the page load or earlier prompts on the same tab
+            current = self.hot_page.network.as_dict()
+            savings = {key: value - self._network_start.get(key, 0) for key, value in current.items()}
+            logger.info("Network interception stats", extra={"request_id": self.request_id, "props": savings})
+        if keep_page:
+            logger.info("Keeping page for the next prompt", extra={"request_id": self.request_id})
+            return
         logger.info("Cleaning up browser resources", extra={"request_id": self.request_id})
-        try:
-            if self.context:
-                await self.context.close()
-            if self.browser:
-                await self.browser.close()
-            if self.playwright:
-                await self.playwright.stop()
-        except Exception as e:
-            logger.error(f"Error during cleanup: {e}", extra={"request_id": self.request_id})
+        if self.hot_page:
+            # Healthy tabs are reused for later prompts; failed ones are closed and replaced
+            await page_pool.recycle(self.hot_page, healthy=self.completed)
+            self.hot_page = None
 
-    async def _on_chunk(self, text: str):
+    async def _on_chunk(self, offset: int, delta: str, resync: bool):
         """Callback for DOMObserver"""
         # We only want to log size, not full text to avoid log spam
-        msg_len = len(text)
-        prev_len = len(self.accumulated_text)
-        if msg_len > prev_len:
-            # logger.debug(f"Received chunk update. Length: {msg_len}")
+        # logger.debug(f"Received chunk update. Length: {self.buffer.length + len(delta)}")
+        if not self.buffer.length and "ttft" not in self.timings:
+            self._mark("ttft")
+        now = time.perf_counter()
+        if self._last_chunk_at is not None:
+            latency_history.observe("inter_token", now - self._last_chunk_at)
+        self._last_chunk_at = now
+        replaced = self.buffer.apply(offset, delta, resync)
+        if self.on_text:
+            self.on_text(self.buffer.text if replaced else delta, replaced)
+
+    async def _on_generation_event(self, event: str):
+        """Callback for the in-page generation watcher"""
+        if event == "started":
+            self.generation_started.set()
+        elif event == "done":
+            self.generation_started.set()
+            self.generation_done.set()
+
+    async def _wait_event(self, event: asyncio.Event, timeout: float):
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
             pass
-        self.accumulated_text = text
 
-    async def process_request(self, request: GenerateRequest) -> GenerateResponse:
-        logger.info(f"Starting browser processing for request {self.request_id}", extra={"request_id": self.request_id})
-        
+    async def _attach_to_response(self):
+        if self.observer.attached:
+            return
         try:
-            self.playwright = await async_playwright().start()
-            
-            # Browser launch arguments for stealth
-            args = [
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-setuid-sandbox",
-                "--disable-infobars",
-                "--window-position=0,0",
-                "--ignore-certifcate-errors",
-                "--ignore-certifcate-errors-spki-list",
-                "--disable-accelerated-2d-canvas",
-                "--no-zygote",
-                "--no-first-run",
-                "--disable-dev-shm-usage",
-            ]
-
-            self.browser = await self.playwright.chromium.launch(
-                # If you comment this and uncomment this you will be able to see the browser in action
-                #headless=False, 
-                headless=config.BROWSER_HEADLESS,
-                args=args
-            )
-            
-            self.context = await self.browser.new_context(
-                viewport={"width": 1280, "height": 720},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
-            )
-            
-            # Apply stealth
-            self.page = await self.context.new_page()
-            await stealth_async(self.page)
-            
-            # 1. Navigation
-            logger.info("Navigating to ChatGPT", extra={"request_id": self.request_id})
-            try:
-                await self.page.goto("https://chat.openai.com/", timeout=config.TIMEOUT_PAGE_LOAD * 1000)
-            except Exception as e:
-                logger.error(f"Navigation timeout or error: {e}", extra={"request_id": self.request_id})
-                return self._failure_response(FailureReason.FAIL_TIMEOUT, "Navigation failed")
+            # locators = self.page.locator('[data-message-author-role="assistant"]') # old selector
+            # OpenAI often changes classes. .markdown is usually safe but might pick up user message?
+            # User message usually has .whitespace-pre-wrap
 
-            # 1.5 Handle potential "Welcome" or "Log in" popups
-            logger.info("Waiting for input box", extra={"request_id": self.request_id})
-            
-            prompt_area = None
-            # Expanded selectors list
-            selectors = [
-                "#prompt-textarea",
-                "textarea[id='prompt-textarea']",
-                "textarea[data-id='root']",
-                "div[contenteditable='true']",
-                "textarea[placeholder='Message ChatGPT…']",
-                "textarea[placeholder='Message ChatGPT']"
-            ]
-            
-            # Wait a bit for page load
-            await asyncio.sleep(2)
+            locators = self.page.locator('.markdown')
+            count = await locators.count()
 
-            for i in range(10): # retry loop (increased)
-                # Check for "Stay logged out"
-                try:
-                    stay_logged_out = self.page.locator("div", has_text="Stay logged out").last
-                    if await stay_logged_out.is_visible():
-                        logger.info("Clicking 'Stay logged out'", extra={"request_id": self.request_id})
-                        await stay_logged_out.click()
-                        await asyncio.sleep(1)
-                except:
-                    pass
-
-                # Check for "Login" landing page - if we see "Log in" and "Sign up" buttons, we might be stuck
-                try:
-                    login_btn = self.page.locator("button", has_text="Log in").first
-                    if await login_btn.is_visible():
-                         logger.warning("Detected 'Log in' button. Might be on landing page.", extra={"request_id": self.request_id})
-                         # Potentially could try to click "Start messaging" or similar if available without login, 
-                         # but usually "Stay logged out" covers it.
-                except:
-                    pass
-
-                for selector in selectors:
-                    try:
-                        loc = self.page.locator(selector).first
-                        if await loc.is_visible():
-                            prompt_area = loc
-                            break
-                    except:
-                        pass
-                
-                if prompt_area:
-                    break
-                
-                await asyncio.sleep(1)
+            # On a reused tab the earlier answers are still there; wait for the new one
+            if count > self.previous_messages:
+                # We need to make sure it's not the user's prompt (which might be markdown rendered too?)
+                # But honestly, `on_chunk` will handle text updates.
+                # If we attach to the last one, it's likely the new response.
 
-            if not prompt_area:
-                logger.error("Input box not found. Check if blocked or CAPTCHA.", extra={"request_id": self.request_id})
-                await self._take_screenshot("no_input_box")
-                await self._dump_html("no_input_box")
-                
-                # Capture debug info
-                page_title = await self.page.title()
-                try:
-                    body_text = await self.page.inner_text("body")
-                    body_snippet = body_text[:500].replace("\n", " ")
-                except:
-                    body_snippet = "Could not get body text"
+                last_msg = locators.last
+                # Check if it has content (streaming might start empty)
+                if await last_msg.is_visible():
+                     element_handle = await last_msg.element_handle()
+                     if element_handle:
+                          await self.observer.attach(element_handle)
+        except Exception as e:
+            pass
 
-                return self._failure_response(FailureReason.FAIL_UI_CHANGE, f"Input box not found. Title: {page_title}. Body: {body_snippet}")
+    async def _read_response_text(self):
+        # The done event can beat the observer attaching on very short answers
+        try:
+            locators = self.page.locator('.markdown')
+            if await locators.count() > self.previous_messages:
+                self.buffer.reset(await locators.last.inner_text())
+                if self.on_text:
+                    self.on_text(self.buffer.text, True)
+        except Exception as e:
+            logger.error("Failed to read response text: %s", e, extra={"request_id": self.request_id})
+
+    async def process_request(self, request: GenerateRequest, keep_page: bool = False) -> GenerateResponse:
+        """
+        Runs one prompt. With keep_page the page is not released after a successful
+        answer and stays in `self.hot_page` for the caller's next prompt.
+        """
+        logger.info("Starting browser processing for request %s", self.request_id, extra={"request_id": self.request_id})
+        profile = profiler.begin_request(self.request_id)
+        
+        try:
+            # 1. Take a pre-navigated page with the prompt box already located
+            try:
+                if self.hot_page is None:
+                    self.hot_page = await page_pool.acquire(self.request_id, request.session_id)
+                    self._mark("page_acquire")
+                    self._snapshot_network()
+                else:
+                    self._snapshot_network()
+                    # Same tab as the previous prompt: start a new chat in place
+                    self.hot_page.prompt_area = await new_chat(self.hot_page.page, self.request_id, self.timings)
+                    self._stage_start = time.perf_counter()
+            except PagePreparationError as e:
+                logger.error("No hot page available: %s", e.message, extra={"request_id": self.request_id})
+                return self._failure_response(e.reason, e.message)
+
+            self.tracing = await profiler.start_trace(self.hot_page, self.request_id)
+            self.context = self.hot_page.context
+            self.page = self.hot_page.page
+            prompt_area = self.hot_page.prompt_area
+            self.hot_page.prompts += 1
+
+            # Setup Observer before sending so the generation watcher sees the stop button appear
+            if self.hot_page.observer is None:
+                self.hot_page.observer = DOMObserver(self.page, self._on_chunk, self._on_generation_event)
+                self.observer = self.hot_page.observer
+                await self.observer.setup()
+            else:
+                self.observer = self.hot_page.observer
+                self.observer.bind(self._on_chunk, self._on_generation_event)
+                await self.observer.arm()
 
             # 2. Input Prompt
-            logger.info(f"Entering prompt into {prompt_area}", extra={"request_id": self.request_id})
+            logger.info("Entering prompt into %s", prompt_area, extra={"request_id": self.request_id})
             try:
-                await prompt_area.fill(request.prompt)
-            except:
-                # If fill fails (e.g. contenteditable div), try type
-                await prompt_area.click()
-                await self.page.keyboard.type(request.prompt)
-            
-            await asyncio.sleep(0.5)
+                method = await enter_prompt(self.page, prompt_area, request.prompt, self.request_id)
+            except RuntimeError as e:
+                logger.error("%s", e, extra={"request_id": self.request_id})
+                await self._take_screenshot("prompt_input", FailureReason.FAIL_UI_CHANGE)
+                return self._failure_response(FailureReason.FAIL_UI_CHANGE, str(e))
+            logger.info("Entered %d characters via %s", len(request.prompt), method, extra={"request_id": self.request_id})
+
+            # The send button enables once the page has taken the input
+            if not await wait_send_enabled(self.page, config.SEND_ENABLED_TIMEOUT):
+                logger.warning("Send button did not enable in time", extra={"request_id": self.request_id})
 
-            # Click send button - Try multiple selectors
+            # Click send button - one probe checks all candidate selectors
             send_clicked = False
-            send_selectors = [
-                "button[data-testid='send-button']", 
-                "button[aria-label='Send prompt']",
-                "button:has-text('Send')"
-            ]
-            
-            for selector in send_selectors:
-                try:
-                    btn = self.page.locator(selector).last
-                    if await btn.is_visible() and await btn.is_enabled():
-                        logger.info(f"Clicking send button: {selector}", extra={"request_id": self.request_id})
-                        await btn.click()
-                        send_clicked = True
-                        break
-                except:
-                    pass
+            try:
+                state = await probe_page(self.page)
+                self.previous_messages = state.messages
+                if state.send_selector:
+                    logger.info("Clicking send button: %s", state.send_selector, extra={"request_id": self.request_id})
+                    await self.page.locator(state.send_selector).last.click()
+                    send_clicked = True
+            except Exception:
+                if self.hot_page.prompts > 1:
+                    self.previous_messages = await self.page.locator('.markdown').count()
             
             if not send_clicked:
                 logger.info("Send button not found or enabled, pressing Enter", extra={"request_id": self.request_id})
                 await self.page.keyboard.press("Enter")
+            self._mark("prompt_input")
 
-            # 3. Setup Observer
-            self.observer = DOMObserver(self.page, self._on_chunk)
-            await self.observer.setup()
-
-            # 4. Wait for generation start
+            # 3. Wait for generation start
             logger.info("Waiting for generation to start", extra={"request_id": self.request_id})
             start_wait = time.time()
+            # Learned from recent requests (see app/latency_history.py), fixed for this one
+            start_timeout = latency_history.get("TIMEOUT_GENERATION_START")
+            start_poll = latency_history.get("POLL_GENERATION_START")
 
             generation_started = False
             
-            while time.time() - start_wait < config.TIMEOUT_GENERATION_START:
-                # Check for "Sign up to chat" modal or similar blockage
+            while time.time() - start_wait < start_timeout:
+                # Modal and stop button are read in the same probe
                 try:
-                    if await self.page.locator("div", has_text="Sign up to chat").is_visible():
-                         logger.error("Blocked by 'Sign up to chat' modal", extra={"request_id": self.request_id})
-                         await self._take_screenshot("signup_modal")
-                         return self._failure_response(FailureReason.FAIL_UI_CHANGE, "Blocked by 'Sign up to chat' modal")
-                except:
-                    pass
+                    state = await probe_page(self.page)
+                except Exception:
+                    state = None
+
+                # Check for "Sign up to chat" modal or similar blockage
+                if state and state.sign_up_modal:
+                    logger.error("Blocked by 'Sign up to chat' modal", extra={"request_id": self.request_id})
+                    await self._take_screenshot("signup_modal", FailureReason.FAIL_UI_CHANGE)
+                    return self._failure_response(FailureReason.FAIL_UI_CHANGE, "Blocked by 'Sign up to chat' modal")
 
                 # Try to find assistant message
-                try:
-                    # locators = self.page.locator('[data-message-author-role="assistant"]') # old selector
-                    # OpenAI often changes classes. .markdown is usually safe but might pick up user message?
-                    # User message usually has .whitespace-pre-wrap
-                    
-                    locators = self.page.locator('.markdown')
-                    count = await locators.count()
-                    
-                    if count > 0:
-                        # logger.info(f"Found {count} markdown elements")
-                        # We need to make sure it's not the user's prompt (which might be markdown rendered too?)
-                        # But honestly, `on_chunk` will handle text updates.
-                        # If we attach to the last one, it's likely the new response.
-                        
-                        last_msg = locators.last
-                        # Check if it has content (streaming might start empty)
-                        if await last_msg.is_visible():
-                             element_handle = await last_msg.element_handle()
-                             if element_handle:
-                                  await self.observer.attach(element_handle)
-                except Exception as e:
-                    pass
-
-                if self.accumulated_text:
+                await self._attach_to_response()
+
+                if self.buffer.length:
                     generation_started = True
                     break
                 
-                if await self.observer.check_generation_indicators():
+                if self.generation_started.is_set() or (state and state.generating):
                     generation_started = True
                     break
-                    
-                await asyncio.sleep(0.5)
+
+                # Woken early by the in-page "started" event
+                await self._wait_event(self.generation_started, start_poll)
 
             if not generation_started:
-                 logger.error("Generation did not start", extra={"request_id": self.request_id})
-                 await self._take_screenshot("generation_not_started")
-                 await self._dump_html("generation_not_started")
+                 logger.error("Generation did not start within %.0fs", start_timeout, extra={"request_id": self.request_id})
+                 await self._take_screenshot("generation_not_started", FailureReason.FAIL_TIMEOUT)
+                 await self._dump_html("generation_not_started", FailureReason.FAIL_TIMEOUT)
                  return self._failure_response(FailureReason.FAIL_TIMEOUT, "Generation did not start")
 
             logger.info("Generation started. Streaming...", extra={"request_id": self.request_id})
 
-            # 5. Monitor for completion
+            # 4. Monitor for completion
+            # The in-page watcher signals "done" as soon as the stop button goes away;
+            # the inactivity check only remains as a fallback if that event never arrives.
             last_change_time = time.time()
             last_text_len = 0
+            hard_limit = latency_history.get("TIMEOUT_GLOBAL_HARD_LIMIT")
+            inactivity_timeout = latency_history.get("TIMEOUT_GENERATION_INACTIVITY")
+            completion_poll = latency_history.get("POLL_COMPLETION")
             
             while True:
-                if time.time() - self.start_time > config.TIMEOUT_GLOBAL_HARD_LIMIT:
+                if time.time() - self.start_time > hard_limit:
                      return self._failure_response(FailureReason.FAIL_TIMEOUT, "Global hard limit reached")
+
+                if self.generation_done.is_set():
+                    logger.info("Generation detected complete (done event)", extra={"request_id": self.request_id})
+                    break
+
+                # Generation may have started before the response element existed
+                if not self.observer.attached:
+                    await self._attach_to_response()
                 
-                current_len = len(self.accumulated_text)
+                current_len = self.buffer.length
                 now = time.time()
                 
                 if current_len != last_text_len:
                     last_change_time = now
                     last_text_len = current_len
                 
-                if now - last_change_time > config.TIMEOUT_GENERATION_INACTIVITY:
+                if now - last_change_time > inactivity_timeout:
                     is_stop_visible = await self.observer.check_generation_indicators()
                     if not is_stop_visible:
                         logger.info("Generation detected complete (inactivity + no stop button)", extra={"request_id": self.request_id})
                         break
                 
-                await asyncio.sleep(0.5)
+                await self._wait_event(self.generation_done, completion_poll)
+
+            if not self.buffer.length:
+                await self._read_response_text()
+            self._mark("completion")
+            latency_history.observe("request", time.time() - self.start_time)
 
+            self.completed = True
             return GenerateResponse(
                 request_id=self.request_id,
                 status=TaskStatus.COMPLETED,
                 output_text=self.accumulated_text,
                 failure_reason=FailureReason.SUCCESS_FULL,
-                latency_ms=int((time.time() - self.start_time) * 1000)
+                latency_ms=int((time.time() - self.start_time) * 1000),
+                timings=dict(self.timings)
             )
 
         except Exception as e:
-            logger.error(f"Unexpected error: {e}\n{traceback.format_exc()}", extra={"request_id": self.request_id})
-            await self._take_screenshot("unexpected_error")
-            await self._dump_html("unexpected_error")
+            logger.error("Unexpected error: %s", e, exc_info=True, extra={"request_id": self.request_id})
+            await self._take_screenshot("unexpected_error", FailureReason.FAIL_UNKNOWN)
+            await self._dump_html("unexpected_error", FailureReason.FAIL_UNKNOWN)
             return self._failure_response(FailureReason.FAIL_UNKNOWN, str(e))
             
         finally:
-            await self._cleanup()
+            await self._cleanup(keep_page=keep_page and self.completed)
+            profiler.end_request(profile)
 
-    async def _take_screenshot(self, name: str):
-        if self.page:
-            try:
-                path = f"{config.SCREENSHOT_DIR}/{self.request_id}_{name}.png"
-                await self.page.screenshot(path=path)
-                logger.info(f"Screenshot saved to {path}", extra={"request_id": self.request_id})
-            except Exception as e:
-                logger.error(f"Failed to take screenshot: {e}", extra={"request_id": self.request_id})
-
-    async def _dump_html(self, name: str):
-        if self.page:
-            try:
-                path = f"{config.HTML_SNAPSHOT_DIR}/{self.request_id}_{name}.html"
-                content = await self.page.content()
-                with open(path, "w", encoding="utf-8") as f:
-                    f.write(content)
-                logger.info(f"HTML snapshot saved to {path}", extra={"request_id": self.request_id})
-            except Exception as e:
-                logger.error(f"Failed to save HTML snapshot: {e}", extra={"request_id": self.request_id})
+    async def _take_screenshot(self, name: str, reason: Optional[FailureReason] = None):
+        await take_screenshot(self.page, self.request_id, name, reason)
+
+    async def _dump_html(self, name: str, reason: Optional[FailureReason] = None):
+        await dump_html(self.page, self.request_id, name, reason)
 
     def _failure_response(self, reason: FailureReason, msg: str) -> GenerateResponse:
         return GenerateResponse(
@@ -318,5 +332,6 @@ class BrowserService:
             failure_reason=reason,
             output_text=self.accumulated_text, # Return partial text if any
             error_message=msg,
-            latency_ms=int((time.time() - self.start_time) * 1000)
+            latency_ms=int((time.time() - self.start_time) * 1000),
+            timings=dict(self.timings)
         )
@@ -0,0 +1,137 @@
+import time
+from collections import Counter, deque
+from typing import Optional, Tuple
+from app.config import config
+from app.models import FailureReason
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+SUCCESSES = (FailureReason.SUCCESS_FULL, FailureReason.SUCCESS_PARTIAL)
+
+class CircuitBreaker:
+    """
+    Stops sending work to browsers while the upstream is failing. Outcomes of
+    the last BREAKER_WINDOW seconds are kept per FailureReason; once at least
+    BREAKER_MIN_REQUESTS finished and one reason's share reaches its threshold
+    in BREAKER_FAILURE_RATES, the breaker opens and jobs fail fast. After the
+    open period, up to BREAKER_HALF_OPEN_PROBES jobs are admitted as probes and
+    everything else is rejected until they finish: a success
+    closes the breaker, any failure reopens it for twice as long (up to
+    BREAKER_MAX_OPEN_SECONDS).
+    """
+    def __init__(self, thresholds: dict = config.BREAKER_FAILURE_RATES, enabled: bool = config.BREAKER_ENABLED):
+        self.enabled = enabled
+        self.thresholds = {FailureReason(reason): rate for reason, rate in thresholds.items()}
+        # (finished_at, failure_reason) of recent browser runs
+        self.outcomes: deque = deque()
+        self._state = CLOSED
+        self.tripped_by: Optional[FailureReason] = None
+        self.open_until = 0.0
+        self.open_seconds = config.BREAKER_OPEN_SECONDS
+        self.probes = 0
+        # Probe slots held by admitted jobs that have not started yet
+        self.reserved = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.time() >= self.open_until:
+            self._state = HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> int:
+        return max(1, int(self.open_until - time.time() + 0.999))
+
+    def _free_probes(self) -> int:
+        return config.BREAKER_HALF_OPEN_PROBES - self.probes - self.reserved
+
+    def admits(self, count: int = 1) -> bool:
+        """Whether `count` new jobs may be queued; while half-open only into free probe slots."""
+        state = self.state
+        return not self.enabled or state == CLOSED or (state == HALF_OPEN and count <= self._free_probes())
+
+    def reserve(self) -> bool:
+        """Holds a probe slot for a job being queued while half-open; released by `acquire` or `unreserve`."""
+        if not self.enabled or self.state != HALF_OPEN or self._free_probes() < 1:
+            return False
+        self.reserved += 1
+        return True
+
+    def unreserve(self):
+        """For a reserved job that finished or was cancelled without running."""
+        self.reserved -= 1
+
+    def acquire(self, reserved: bool = False) -> Tuple[bool, bool]:
+        """Called before a job runs in a browser. Returns (allowed, is_probe)."""
+        if reserved:
+            self.reserved -= 1
+        state = self.state
+        if not self.enabled or state == CLOSED:
+            return True, False
+        # Jobs queued before the breaker opened must not take a slot held for an admitted probe
+        if state == HALF_OPEN and (reserved or self._free_probes() >= 1):
+            self.probes += 1
+            return True, True
+        self.rejected += 1
+        return False, False
+
+    def record(self, reason: Optional[FailureReason], probe: bool):
+        """Feeds back the outcome of a job allowed by `acquire`; None if it was cancelled."""
+        now = time.time()
+        if probe:
+            self.probes -= 1
+            if reason is None:
+                return
+            if reason in SUCCESSES:
+                self._close()
+            else:
+                self._open(reason, now, self.open_seconds * 2)
+            return
+        if reason is None or self._state != CLOSED:
+            return
+
+        self.outcomes.append((now, reason))
+        while self.outcomes and now - self.outcomes[0][0] > config.BREAKER_WINDOW:
+            self.outcomes.popleft()
+        if len(self.outcomes) < config.BREAKER_MIN_REQUESTS or reason not in self.thresholds:
+            return
+        share = sum(1 for _, r in self.outcomes if r == reason) / len(self.outcomes)
+        if share >= self.thresholds[reason]:
+            self._open(reason, now, config.BREAKER_OPEN_SECONDS)
+
+    def _open(self, reason: FailureReason, now: float, seconds: float):
+        self._state = OPEN
+        self.tripped_by = reason
+        self.open_seconds = min(seconds, config.BREAKER_MAX_OPEN_SECONDS)
+        self.open_until = now + self.open_seconds
+        self.opened += 1
+
+    def _close(self):
+        self._state = CLOSED
+        self.tripped_by = None
+        self.open_seconds = config.BREAKER_OPEN_SECONDS
+        self.outcomes.clear()
+
+    def describe(self) -> str:
+        return f"Circuit open after repeated {self.tripped_by.value if self.tripped_by else 'failures'}; retry in {self.retry_after()}s"
+
+    def stats(self) -> dict:
+        state = self.state
+        counts = Counter(reason.value for _, reason in self.outcomes)
+        total = len(self.outcomes)
+        return {
+            "enabled": self.enabled,
+            "state": state,
+            "tripped_by": self.tripped_by.value if self.tripped_by else None,
+            "retry_after_s": self.retry_after() if state == OPEN else 0,
+            "window_requests": total,
+            "rates": {reason: round(count / total, 3) for reason, count in counts.items()},
+            "probes_in_flight": self.probes,
+            "probes_reserved": self.reserved,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+circuit_breaker = CircuitBreaker()
@@ -6,18 +6,170 @@ class Config:
     PORT = 8000
     
     # Browser Automation Configuration
+    CHAT_URL = os.getenv("CHAT_URL", "https://chat.openai.com/")  # Point at benchmarks.mock_chat for local runs
     MAX_CONCURRENT_BROWSERS = int(os.getenv("MAX_CONCURRENT_BROWSERS", "2"))
+    CONTEXTS_PER_BROWSER = int(os.getenv("CONTEXTS_PER_BROWSER", "1"))  # Isolated contexts sharing one Chromium process
+    MAX_CONCURRENT_CONTEXTS = MAX_CONCURRENT_BROWSERS * CONTEXTS_PER_BROWSER
+    # Browser-host processes the API dispatches jobs to (0 = run browsers in the API process).
+    # Each host runs MAX_CONCURRENT_BROWSERS browsers with CONTEXTS_PER_BROWSER contexts.
+    BROWSER_HOSTS = int(os.getenv("BROWSER_HOSTS", "0"))
+    TOTAL_CONCURRENT_CONTEXTS = MAX_CONCURRENT_CONTEXTS * max(BROWSER_HOSTS, 1)
+    BROWSER_HOST_SOCKET_DIR = os.getenv("BROWSER_HOST_SOCKET_DIR", "/tmp")
+    BROWSER_HOST_START_TIMEOUT = 60
+    BROWSER_HOST_MAX_REQUEUES = 2  # Times a job is resent after its host crashed
+    BROWSER_HOST_MESSAGE_LIMIT = 2**24  # Largest IPC message (bytes)
     BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "True").lower() == "true"  # Set to True for production/background running
+    BROWSER_HEALTH_CHECK_INTERVAL = int(os.getenv("BROWSER_HEALTH_CHECK_INTERVAL", "30"))
+    BROWSER_HEALTH_CHECK_TIMEOUT = 5
+    BROWSER_MAX_LEASES = int(os.getenv("BROWSER_MAX_LEASES", "200"))  # Recycle a browser after this many contexts
+    BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1500"))  # ...or once its process tree uses more memory than this
+
+    # Hot page pool (pre-navigated pages with the prompt box located)
+    HOT_PAGE_MAX_AGE = int(os.getenv("HOT_PAGE_MAX_AGE", "600"))  # Discard pages older than this (seconds)
+    HOT_PAGE_SWEEP_INTERVAL = 30
+    HOT_PAGE_RETRY_DELAY = 5
+    HOT_PAGE_ACQUIRE_TIMEOUT = int(os.getenv("HOT_PAGE_ACQUIRE_TIMEOUT", "60"))
+    # Tab reuse: a used page starts a new chat in place instead of being closed
+    PAGE_MAX_PROMPTS = int(os.getenv("PAGE_MAX_PROMPTS", "10"))  # Recycle a tab after this many prompts (1 = fresh page per prompt)
+    NEW_CHAT_TIMEOUT = 5  # Reload the chat if the in-place new chat has not cleared the thread by then
+    SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", "600"))  # Close a session's tab after this long without prompts
     
-    # Timeouts (in seconds)
-    TIMEOUT_GLOBAL_HARD_LIMIT = 300  # 5 minutes
-    TIMEOUT_PAGE_LOAD = 30
-    TIMEOUT_GENERATION_START = 60
-    TIMEOUT_GENERATION_INACTIVITY = 4
+    # Network interception: blocked requests are aborted, hashed JS/CSS is served from a shared disk cache
+    NETWORK_INTERCEPTION = os.getenv("NETWORK_INTERCEPTION", "True").lower() == "true"
+    NETWORK_BLOCK_RESOURCE_TYPES = set(filter(None, os.getenv("NETWORK_BLOCK_RESOURCE_TYPES", "image,media,font").split(",")))
+    NETWORK_BLOCK_URL_PATTERNS = list(filter(None, os.getenv(
+        "NETWORK_BLOCK_URL_PATTERNS",
+        r"google-analytics\.com,googletagmanager\.com,doubleclick\.net,segment\.(io|com),sentry\.io,datadoghq\.com,intercom\.io"
+    ).split(",")))  # Regular expressions matched against the URL
+    ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", "cache/assets")  # Empty disables the asset cache
+    ASSET_CACHE_MAX_MB = int(os.getenv("ASSET_CACHE_MAX_MB", "512"))
+    ASSET_CACHE_SAVE_INTERVAL = 30  # Seconds between index saves; also saved when the page pool stops
+
+    # Prompt input: fill, then a single insertText, then a synthetic paste
+    PROMPT_FILL_TIMEOUT = 5  # Seconds fill() may wait for the prompt box before the next method is tried
+    PROMPT_TYPE_MAX_CHARS = 2000  # Key-by-key typing is a last resort only up to this length
+    SEND_ENABLED_TIMEOUT = int(os.getenv("SEND_ENABLED_TIMEOUT", "5"))  # Wait for the send button to enable, then press Enter instead
+
+    # DOM observer: how often streamed text is flushed to Python (0 = once per animation frame)
+    OBSERVER_FLUSH_INTERVAL_MS = int(os.getenv("OBSERVER_FLUSH_INTERVAL_MS", "0"))
+
+    # Admission control
+    MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "100"))  # Queued jobs beyond this are rejected with 503
+    ADMISSION_INITIAL_SERVICE_TIME = 30  # Assumed seconds per job until real ones are observed
+    ADMISSION_SERVICE_TIME_ALPHA = 0.2
+    DISCONNECT_POLL_INTERVAL = 1  # How often waiting /generate calls check whether the client is still there
+
+    # Circuit breaker: fail fast while one FailureReason dominates recent outcomes
+    BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "True").lower() == "true"
+    BREAKER_FAILURE_RATES = {  # Share of recent outcomes that opens the breaker, per FailureReason
+        reason: float(rate)
+        for reason, rate in (item.split("=", 1) for item in os.getenv(
+            "BREAKER_FAILURE_RATES", "FAIL_UI_CHANGE=0.5,FAIL_CAPTCHA=0.5,FAIL_TIMEOUT=0.8"
+        ).split(",") if "=" in item)
+    }
+    BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "120"))  # Seconds of outcomes the rates are taken over
+    BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "5"))
+    BREAKER_OPEN_SECONDS = int(os.getenv("BREAKER_OPEN_SECONDS", "10"))  # First open period; doubles on each failed probe
+    BREAKER_MAX_OPEN_SECONDS = 300
+    BREAKER_HALF_OPEN_PROBES = 1  # Jobs let through at once to test recovery
+
+    # Profiling, served at /debug/profile
+    PROFILE_LOOP_LAG = os.getenv("PROFILE_LOOP_LAG", "True").lower() == "true"  # Sample event-loop lag
+    PROFILE_LAG_INTERVAL = 0.1
+    PROFILE_LAG_SAMPLES = 3000  # About five minutes of samples
+    PROFILE_LAG_BLOCKED_MS = 100  # Lag above this counts as a blocked loop
+    PROFILE_PLAYWRIGHT = os.getenv("PROFILE_PLAYWRIGHT", "False").lower() == "true"  # Count and time every Playwright call
+    PROFILE_RECENT_REQUESTS = 50
+    PROFILE_TRACE_SAMPLE_RATE = float(os.getenv("PROFILE_TRACE_SAMPLE_RATE", "0"))  # Share of requests recorded as Playwright traces
+    PROFILE_TRACE_DIR = os.getenv("PROFILE_TRACE_DIR", "logs/traces")
+    PROFILE_DUMP_DIR = os.getenv("PROFILE_DUMP_DIR", "logs/profiles")
+
+    # Hedged requests: a second attempt for jobs that stream nothing for longer than the recent p95 time to first text
+    HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "False").lower() == "true"
+    HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))  # Hedges earned per job, i.e. at most ~10% extra attempts
+    HEDGE_BUDGET_BURST = 5  # Unused hedges saved up for a burst of slow starts
+    HEDGE_INITIAL_DELAY = int(os.getenv("HEDGE_INITIAL_DELAY", "15"))  # Threshold until ADAPTIVE_MIN_SAMPLES first texts are seen (seconds)
+    HEDGE_MIN_DELAY = 2
+    HEDGE_MAX_DELAY = 30
+
+    # Worker supervisor
+    MIN_WORKERS = int(os.getenv("MIN_WORKERS", "1"))  # Kept alive even when idle; the maximum is TOTAL_CONCURRENT_CONTEXTS
+    WORKER_IDLE_TIMEOUT = int(os.getenv("WORKER_IDLE_TIMEOUT", "60"))  # Workers above the minimum exit after idling this long
+    WORKER_SUPERVISOR_INTERVAL = 1
+    WORKER_SCALE_UP_WAIT = int(os.getenv("WORKER_SCALE_UP_WAIT", "5"))  # Add workers while queue wait is above this and rising (seconds)
+    MEMORY_PRESSURE_MIN_AVAILABLE = float(os.getenv("MEMORY_PRESSURE_MIN_AVAILABLE", "0.1"))  # Shed workers below this fraction of free memory
+
+    # Response cache (keyed on the normalized prompt)
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+    CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # seconds
+    CACHE_DISK_PATH = os.getenv("CACHE_DISK_PATH", "")  # SQLite file; empty keeps the cache in memory only
+    CACHE_DISK_MAX_ENTRIES = int(os.getenv("CACHE_DISK_MAX_ENTRIES", "100000"))
+
+    # Batches
+    BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "500"))
+    BATCH_PROMPTS_PER_PAGE = int(os.getenv("BATCH_PROMPTS_PER_PAGE", "5"))  # Prompts sent in a row on one page with reuse_page
+
+    # Asynchronous jobs (/jobs) and their journal
+    JOB_JOURNAL_PATH = os.getenv("JOB_JOURNAL_PATH", "logs/jobs.jsonl")
+    JOB_JOURNAL_FSYNC = os.getenv("JOB_JOURNAL_FSYNC", "True").lower() == "true"
+    JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "86400"))  # Keep finished results this long (seconds)
+    JOB_COMPACT_INTERVAL = int(os.getenv("JOB_COMPACT_INTERVAL", "3600"))
+    JOB_LONG_POLL_MAX = 60
+
+    # Timeouts and poll intervals (in seconds). With ADAPTIVE_TIMEOUTS these are only used until
+    # enough latencies were observed (see app/latency_history.py); setting one in the environment pins it.
+    TIMEOUT_GLOBAL_HARD_LIMIT = float(os.getenv("TIMEOUT_GLOBAL_HARD_LIMIT", "300"))  # 5 minutes
+    TIMEOUT_PAGE_LOAD = float(os.getenv("TIMEOUT_PAGE_LOAD", "30"))
+    TIMEOUT_GENERATION_START = float(os.getenv("TIMEOUT_GENERATION_START", "60"))
+    TIMEOUT_GENERATION_INACTIVITY = float(os.getenv("TIMEOUT_GENERATION_INACTIVITY", "4"))  # Fallback only; completion is normally signalled by the in-page watcher
+    SETTLE_AFTER_NAVIGATION = float(os.getenv("SETTLE_AFTER_NAVIGATION", "2"))  # Before the first look for the prompt box
+    TIMEOUT_INPUT_DISCOVERY = float(os.getenv("TIMEOUT_INPUT_DISCOVERY", "12"))  # Looking for the prompt box after navigation
+    POLL_INPUT_DISCOVERY = float(os.getenv("POLL_INPUT_DISCOVERY", "1"))
+    POLL_GENERATION_START = float(os.getenv("POLL_GENERATION_START", "0.5"))
+    POLL_COMPLETION = float(os.getenv("POLL_COMPLETION", "0.5"))
+
+    # Adaptive timeouts: name -> (stage, quantile, factor, floor, ceiling); floors and ceilings
+    # can be moved with <NAME>_MIN / <NAME>_MAX
+    ADAPTIVE_TIMEOUTS = os.getenv("ADAPTIVE_TIMEOUTS", "True").lower() == "true"
+    ADAPTIVE_MIN_SAMPLES = 20
+    LATENCY_HISTORY_WINDOW = 500  # Observations per estimator generation, so old latencies age out
+    ADAPTIVE_RULES = {
+        name: (stage, q, factor, float(os.getenv(f"{name}_MIN", floor)), float(os.getenv(f"{name}_MAX", ceiling)))
+        for name, (stage, q, factor, floor, ceiling) in {
+            "TIMEOUT_PAGE_LOAD": ("navigation", 0.99, 3, 10, 60),
+            "TIMEOUT_GENERATION_START": ("ttft", 0.99, 3, 15, 120),
+            "TIMEOUT_GENERATION_INACTIVITY": ("inter_token", 0.99, 4, 2, 15),
+            "TIMEOUT_GLOBAL_HARD_LIMIT": ("request", 0.99, 2, 120, 600),
+            "TIMEOUT_INPUT_DISCOVERY": ("input_discovery", 0.99, 3, 5, 30),
+            "SETTLE_AFTER_NAVIGATION": ("input_discovery", 0.5, 0.5, 0.25, 2),
+            "POLL_INPUT_DISCOVERY": ("input_discovery", 0.5, 0.25, 0.1, 1),
+            "POLL_GENERATION_START": ("ttft", 0.5, 0.1, 0.05, 0.5),
+            "POLL_COMPLETION": ("inter_token", 0.5, 4, 0.05, 0.5),
+        }.items()
+    }
     
+    # Logging
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_ASYNC = os.getenv("LOG_ASYNC", "True").lower() == "true"  # Format and write logs on a background thread
+    LOG_RATE_LIMIT_BURST = int(os.getenv("LOG_RATE_LIMIT_BURST", "50"))  # Records per call site per window before sampling (0 = off)
+    LOG_RATE_LIMIT_WINDOW = 10  # seconds
+    LOG_RATE_LIMIT_SAMPLE = int(os.getenv("LOG_RATE_LIMIT_SAMPLE", "100"))  # Beyond the burst, keep 1 in this many
+
     # Paths
     SCREENSHOT_DIR = "logs/screenshots"
     HTML_SNAPSHOT_DIR = "logs/html"
+
+    # Debug artifacts (failure screenshots and HTML), written in the background
+    ARTIFACT_SAMPLE_RATE = float(os.getenv("ARTIFACT_SAMPLE_RATE", "1.0"))  # Fraction of failures captured
+    ARTIFACT_SAMPLE_RATES = {  # Per FailureReason overrides, e.g. "FAIL_TIMEOUT=0.1,FAIL_UI_CHANGE=0.5"
+        reason: float(rate)
+        for reason, rate in (item.split("=", 1) for item in os.getenv("ARTIFACT_SAMPLE_RATES", "").split(",") if "=" in item)
+    }
+    ARTIFACT_MAX_MB = int(os.getenv("ARTIFACT_MAX_MB", "500"))  # Oldest artifacts are deleted beyond this
+    ARTIFACT_QUEUE_SIZE = 32  # Captures waiting to be written; more are dropped
+    ARTIFACT_DEDUP_ENTRIES = 1000
+    ARTIFACT_SCREENSHOT_QUALITY = 60  # JPEG
+    ARTIFACT_CAPTURE_TIMEOUT = 5
     
     # Ensure log directories exist
     os.makedirs(SCREENSHOT_DIR, exist_ok=True)
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from app.config import config
+from app.models import GenerateRequest, GenerateResponse, TaskStatus, FailureReason
+from app.logger import logger
+from app.dom_observer import ChunkBuffer
+
+class HostLost(Exception):
+    """The browser host running a job went away before answering."""
+
+class HostProcess:
+    """One browser-host child process and the connection to it."""
+    def __init__(self, index: int):
+        self.index = index
+        self.socket_path = os.path.join(config.BROWSER_HOST_SOCKET_DIR, f"ghostapi-{os.getpid()}-host-{index}.sock")
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reader_task: Optional[asyncio.Task] = None
+        self.jobs: Dict[str, "RemoteService"] = {}
+        self.ready = False
+        self.restarts = 0
+
+    def send(self, message: dict):
+        if self.writer and not self.writer.is_closing():
+            self.writer.write(json.dumps(message).encode() + b"\n")
+
+class HostDispatcher:
+    """
+    Routes jobs from the API process to BROWSER_HOSTS browser-host processes,
+    each with its own event loop and browser pool, so throughput scales with
+    cores. Jobs go to the host with the fewest in flight; a host that crashes
+    is restarted and its jobs are sent again to the remaining hosts.
+    Prompts of one session stick to the host that holds the session's tab.
+    """
+    def __init__(self, hosts: int = config.BROWSER_HOSTS):
+        self.hosts: List[HostProcess] = [HostProcess(index) for index in range(hosts)]
+        self.available = asyncio.Condition()
+        self.requeued = 0
+        # session_id -> (host index, last use) so a conversation stays on its host
+        self.session_hosts: Dict[str, Tuple[int, float]] = {}
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hosts)
+
+    async def start(self):
+        logger.info("Starting browser hosts", extra={"props": {"hosts": len(self.hosts)}})
+        await asyncio.gather(*(self._start_host(host) for host in self.hosts))
+
+    async def stop(self):
+        self._stopping = True
+        for host in self.hosts:
+            await self._stop_host(host)
+
+    async def _start_host(self, host: HostProcess):
+        if os.path.exists(host.socket_path):
+            os.remove(host.socket_path)
+        host.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "app.browser_host", "--socket", host.socket_path
+        )
+
+        deadline = time.time() + config.BROWSER_HOST_START_TIMEOUT
+        while True:
+            try:
+                reader, host.writer = await asyncio.open_unix_connection(host.socket_path, limit=config.BROWSER_HOST_MESSAGE_LIMIT)
+                break
+            except OSError:
+                if host.process.returncode is not None or time.time() > deadline:
+                    logger.error("Browser host failed to start", extra={"props": {"host": host.index}})
+                    await self._stop_host(host)
+                    # Retried by the reader loop's restart path
+                    asyncio.create_task(self._on_host_lost(host))
+                    return
+                await asyncio.sleep(0.5)
+
+        host.reader_task = asyncio.create_task(self._read_loop(host, reader))
+        async with self.available:
+            host.ready = True
+            self.available.notify_all()
+        logger.info("Browser host connected", extra={"props": {"host": host.index, "pid": host.process.pid}})
+
+    async def _stop_host(self, host: HostProcess):
+        host.ready = False
+        if host.writer:
+            host.writer.close()
+            host.writer = None
+        if host.process and host.process.returncode is None:
+            host.process.terminate()
+            try:
+                await asyncio.wait_for(host.process.wait(), timeout=config.BROWSER_HOST_START_TIMEOUT)
+            except asyncio.TimeoutError:
+                host.process.kill()
+
+    async def _read_loop(self, host: HostProcess, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                service = host.jobs.get(message["job_id"])
+                if service:
+                    service.on_message(message)
+        except Exception as e:
+            logger.error("Browser host connection error: %s", e, extra={"props": {"host": host.index}})
+        if not self._stopping:
+            await self._on_host_lost(host)
+
+    async def _on_host_lost(self, host: HostProcess):
+        logger.warning("Browser host lost, restarting", extra={"props": {"host": host.index, "jobs_lost": len(host.jobs)}})
+        host.ready = False
+        lost, host.jobs = host.jobs, {}
+        for service in lost.values():
+            service.on_host_lost()
+        await self._stop_host(host)
+        host.restarts += 1
+        await asyncio.sleep(config.HOT_PAGE_RETRY_DELAY)
+        if not self._stopping:
+            await self._start_host(host)
+
+    async def assign(self, service: "RemoteService", session_id: Optional[str] = None) -> HostProcess:
+        """
+        Places a job on the connected host with the fewest jobs in flight, or on
+        the session's host while that one is up.
+        """
+        now = time.time()
+        for stale in [sid for sid, (_, used) in self.session_hosts.items() if now - used > config.SESSION_IDLE_TIMEOUT]:
+            del self.session_hosts[stale]
+
+        async with self.available:
+            while True:
+                candidates = [host for host in self.hosts if host.ready]
+                if candidates:
+                    sticky = self.session_hosts.get(session_id) if session_id else None
+                    if sticky and self.hosts[sticky[0]].ready:
+                        host = self.hosts[sticky[0]]
+                    else:
+                        host = min(candidates, key=lambda h: len(h.jobs))
+                    if session_id:
+                        self.session_hosts[session_id] = (host.index, now)
+                    host.jobs[service.request_id] = service
+                    return host
+                await self.available.wait()
+
+    def stats(self) -> dict:
+        return {
+            "hosts": [
+                {
+                    "host": host.index,
+                    "pid": host.process.pid if host.process else None,
+                    "ready": host.ready,
+                    "in_flight": len(host.jobs),
+                    "restarts": host.restarts,
+                }
+                for host in self.hosts
+            ],
+            "requeued": self.requeued,
+            "sessions": len(self.session_hosts),
+        }
+
+class RemoteService:
+    """
+    Stands in for BrowserService when jobs run in browser-host processes: same
+    `process_request`, `buffer` and `on_text` surface, backed by the dispatcher.
+    """
+    def __init__(self, request_id: str, on_text: Optional[Callable[[str, bool], None]] = None):
+        self.request_id = request_id
+        self.on_text = on_text
+        # Pages live in the host process, so they cannot be handed between jobs here
+        self.hot_page = None
+        self.buffer = ChunkBuffer()
+        self._result: Optional[asyncio.Future] = None
+
+    @property
+    def accumulated_text(self) -> str:
+        return self.buffer.text
+
+    def on_message(self, message: dict):
+        event = message["event"]
+        if event == "done":
+            if not self._result.done():
+                self._result.set_result(GenerateResponse.model_validate(message["result"]))
+            return
+        if event == "reset":
+            self.buffer.reset(message["text"])
+        else:
+            self.buffer.apply(self.buffer.length, message["text"])
+        if self.on_text:
+            self.on_text(message["text"], event == "reset")
+
+    def on_host_lost(self):
+        if self._result and not self._result.done():
+            self._result.set_exception(HostLost())
+
+    async def process_request(self, request: GenerateRequest, keep_page: bool = False) -> GenerateResponse:
+        start_time = time.time()
+        for attempt in range(config.BROWSER_HOST_MAX_REQUEUES + 1):
+            self._result = asyncio.get_running_loop().create_future()
+            host = await dispatcher.assign(self, request.session_id)
+            host.send({"op": "generate", "job_id": self.request_id, "request": request.model_dump(mode="json")})
+            try:
+                return await self._result
+            except HostLost:
+                logger.warning("Browser host crashed, requeuing request", extra={"request_id": self.request_id, "props": {"attempt": attempt + 1}})
+                dispatcher.requeued += 1
+                # The next host starts the answer from scratch
+                self.buffer.reset("")
+                if self.on_text:
+                    self.on_text("", True)
+            except asyncio.CancelledError:
+                host.send({"op": "cancel", "job_id": self.request_id})
+                raise
+            finally:
+                if host.jobs.get(self.request_id) is self:
+                    del host.jobs[self.request_id]
+
+        return GenerateResponse(
+            request_id=self.request_id,
+            status=TaskStatus.FAILED,
+            failure_reason=FailureReason.FAIL_UNKNOWN,
+            error_message="Browser host crashed while processing the request",
+            latency_ms=int((time.time() - start_time) * 1000)
+        )
+
+dispatcher = HostDispatcher(config.BROWSER_HOSTS)
@@ -1,58 +1,225 @@
 import asyncio
-from typing import Callable
+from typing import Callable, List, Optional
 from playwright.async_api import Page
+from app.config import config
 from app.logger import logger
 
+STOP_BUTTON_SELECTOR = "button[aria-label='Stop generating'], button[data-testid='stop-button']"
+SEND_BUTTON_SELECTOR = "button[data-testid='send-button']"
+
+# Watches the whole document for the stop button appearing ("started") and then
+# disappearing or the send button coming back ("done"). Checks are coalesced so a
+# burst of streaming mutations costs one querySelector pass.
+GENERATION_WATCHER_SCRIPT = """
+([stopSelector, sendSelector]) => {
+    const visible = (selector) => {
+        const el = document.querySelector(selector);
+        return !!el && el.offsetParent !== null;
+    };
+
+    window._generationState = {started: false, done: false};
+
+    // Stop streaming the previous message; attach() picks up the next one
+    if (window._responseObserver) {
+        window._responseObserver.disconnect();
+        window._responseObserver = null;
+        window._observedElement = null;
+        window._flushMutations = null;
+    }
+
+    if (window._generationWatcherInstalled) {
+        return;
+    }
+    window._generationWatcherInstalled = true;
+
+    let scheduled = false;
+    const check = () => {
+        scheduled = false;
+        const state = window._generationState;
+        if (state.done) {
+            return;
+        }
+        const stopVisible = visible(stopSelector);
+        if (!state.started && stopVisible) {
+            state.started = true;
+            window.on_generation_event_py("started");
+        } else if (state.started && (!stopVisible || visible(sendSelector))) {
+            state.done = true;
+            // Make sure the final text is delivered before the done event
+            if (window._flushMutations) {
+                window._flushMutations();
+            }
+            window.on_generation_event_py("done");
+        }
+    };
+
+    new MutationObserver(() => {
+        if (!scheduled) {
+            scheduled = true;
+            setTimeout(check, 50);
+        }
+    }).observe(document.body, {childList: true, subtree: true, attributes: true});
+}
+"""
+
+class ChunkBuffer:
+    """
+    Rebuilds streamed text from appended deltas. Parts are only joined when the
+    full text is read, so each update costs O(delta) instead of O(text).
+    """
+    def __init__(self):
+        self.parts: List[str] = []
+        self.length = 0
+        self._text: Optional[str] = ""
+
+    def apply(self, offset: int, delta: str, resync: bool = False) -> bool:
+        """Applies a delta and returns True if the text was replaced rather than appended to."""
+        if not resync and offset == self.length:
+            self.parts.append(delta)
+            self.length += len(delta)
+            self._text = None
+            return False
+
+        # Non-append edit, or an offset we did not expect: rebuild from the known prefix
+        base = "" if resync else self.text[:offset]
+        self.reset(base + delta)
+        return True
+
+    def reset(self, text: str):
+        self.parts = [text]
+        self.length = len(text)
+        self._text = text
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(self.parts)
+            self.parts = [self._text]
+        return self._text
+
 class DOMObserver:
-    def __init__(self, page: Page, on_chunk: Callable[[str], None]):
+    def __init__(self, page: Page, on_chunk: Callable[[int, str, bool], None], on_event: Optional[Callable[[str], None]] = None):
         self.page = page
         self.on_chunk = on_chunk
+        self.on_event = on_event
+        self.attached = False
+        # Traffic crossing the CDP bridge for this observer
+        self.bytes_received = 0
+        self.messages_received = 0
+        self.resyncs = 0
 
     async def setup(self):
         """
-        Expose the python function to the browser context.
+        Expose the python functions to the browser context (once per page) and arm the generation watcher.
         """
         await self.page.expose_function("on_mutation_py", self._handle_mutation)
+        await self.page.expose_function("on_generation_event_py", self._handle_generation_event)
+        await self.arm()
 
-    async def _handle_mutation(self, text: str):
-        # logger.info(f"DOMObserver: received mutation text: {text}")
-        if text is not None:
-             # logger.info(f"DOMObserver: calling on_chunk with {len(text)} chars")
+    def bind(self, on_chunk: Callable[[int, str, bool], None], on_event: Optional[Callable[[str], None]] = None):
+        """Points an existing observer at the callbacks of the next request on the same page."""
+        self.on_chunk = on_chunk
+        self.on_event = on_event
+        self.bytes_received = 0
+        self.messages_received = 0
+        self.resyncs = 0
+
+    async def arm(self):
+        """
+        (Re-)arms the generation watcher for the next prompt.
+        Must run before the prompt is sent so the stop button appearing is not missed.
+        """
+        self.attached = False
+        await self.page.evaluate(GENERATION_WATCHER_SCRIPT, [STOP_BUTTON_SELECTOR, SEND_BUTTON_SELECTOR])
+
+    async def _handle_generation_event(self, event: str):
+        logger.info("DOMObserver: generation event '%s'", event)
+        if self.on_event is None:
+            return
+        if asyncio.iscoroutinefunction(self.on_event):
+            await self.on_event(event)
+        else:
+            self.on_event(event)
+
+    async def _handle_mutation(self, offset: int, delta: str, resync: bool):
+        # logger.info(f"DOMObserver: received mutation delta at {offset}: {len(delta)} chars")
+        if delta is not None:
+             self.messages_received += 1
+             self.bytes_received += len(delta.encode("utf-8"))
+             if resync:
+                 self.resyncs += 1
              if asyncio.iscoroutinefunction(self.on_chunk):
-                 await self.on_chunk(text)
+                 await self.on_chunk(offset, delta, resync)
              else:
-                 self.on_chunk(text)
+                 self.on_chunk(offset, delta, resync)
 
     async def attach(self, element_handle):
         """
-        Attaches the mutation observer to the specific element handle.
+        Attaches the mutation observer to the specific element handle, moving it
+        off the previous message when the page is reused. Only the appended suffix
+        crosses the bridge, as (offset, delta, resync); a full resync is sent when
+        the text changes other than by appending.
+        Updates are coalesced per animation frame or per OBSERVER_FLUSH_INTERVAL_MS.
         """
         script = """
-        (element) => {
-            console.log("DOMObserver: attach() called");
-            
-            if (window._observerInstalled) {
-                console.log("DOMObserver: already installed");
+        ([element, flushIntervalMs]) => {
+            if (!element) {
+                console.log("DOMObserver: Element is null");
                 return;
             }
 
-            if (!element) {
-                console.log("DOMObserver: Element is null");
+            // One observer per page, moved to each new assistant message
+            if (window._observedElement === element) {
                 return;
             }
+            if (window._responseObserver) {
+                window._responseObserver.disconnect();
+            }
+            console.log("DOMObserver: observing new response element");
+            window._observedElement = element;
+
+            let sent = "";
+            let scheduled = false;
+
+            const flush = () => {
+                scheduled = false;
+                if (window._flushMutations !== flush) {
+                    // Detached while an update was pending
+                    return;
+                }
+                const text = element.innerText;
+                if (text === sent) {
+                    return;
+                }
+                if (text.startsWith(sent)) {
+                    window.on_mutation_py(sent.length, text.slice(sent.length), false);
+                } else {
+                    window.on_mutation_py(0, text, true);
+                }
+                sent = text;
+            };
+            window._flushMutations = flush;
 
-            console.log("DOMObserver: Target found (via handle), installing observer");
-            window._observerInstalled = true;
-            
             // Send initial text
-            console.log("DOMObserver: Sending initial text length: " + element.innerText.length);
-            window.on_mutation_py(element.innerText);
+            flush();
 
             const observer = new MutationObserver((mutations) => {
-                console.log("DOMObserver: Mutation detected");
-                window.on_mutation_py(element.innerText);
+                if (window._responseObserver !== observer) {
+                    return;
+                }
+                if (scheduled) {
+                    return;
+                }
+                scheduled = true;
+                // Hidden pages do not get animation frames
+                if (flushIntervalMs > 0 || document.hidden) {
+                    setTimeout(flush, flushIntervalMs || 16);
+                } else {
+                    requestAnimationFrame(flush);
+                }
             });
 
+            window._responseObserver = observer;
             observer.observe(element, {
                 childList: true, 
                 subtree: true, 
@@ -60,11 +227,19 @@ class DOMObserver:
             });
         }
         """
-        await self.page.evaluate(script, element_handle)
+        await self.page.evaluate(script, [element_handle, config.OBSERVER_FLUSH_INTERVAL_MS])
+        self.attached = True
+
+    def stats(self) -> dict:
+        return {
+            "bridge_bytes": self.bytes_received,
+            "bridge_messages": self.messages_received,
+            "bridge_resyncs": self.resyncs,
+        }
 
     async def check_generation_indicators(self) -> bool:
         # Check for stop button
         # Using a broad selector for robustness
-        stop_btn = self.page.locator("button[aria-label='Stop generating']")
+        stop_btn = self.page.locator(STOP_BUTTON_SELECTOR).first
         return await stop_btn.is_visible()
 
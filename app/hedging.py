@@ -0,0 +1,63 @@
+from app.config import config
+from app.latency_history import latency_history
+
+class HedgePolicy:
+    """
+    Decides when a job that has streamed nothing yet gets a second attempt.
+    The threshold is the p95 time from job start to first text (the
+    `first_text` stage of the latency history), clamped to
+    [HEDGE_MIN_DELAY, HEDGE_MAX_DELAY]. Every job earns HEDGE_BUDGET hedges
+    (up to HEDGE_BUDGET_BURST saved), so hedging adds at most about that
+    fraction of extra attempts.
+    """
+    def __init__(self, enabled: bool = config.HEDGE_ENABLED, budget: float = config.HEDGE_BUDGET, burst: float = config.HEDGE_BUDGET_BURST):
+        self.enabled = enabled
+        self.budget = budget
+        self.burst = burst
+        self.tokens = burst
+        self.jobs = 0
+        self.launched = 0
+        self.won = 0
+        self.lost = 0
+        self.skipped_budget = 0
+        self.skipped_capacity = 0
+
+    def observe_first_text(self, seconds: float):
+        """Called once for every attempt that streams text, with the time since its job started."""
+        latency_history.observe("first_text", seconds)
+
+    def delay(self) -> float:
+        """Seconds without text after which a job is hedged."""
+        history = latency_history.stages.get("first_text")
+        p95 = history.quantile(0.95) if history else None
+        if p95 is None:
+            return config.HEDGE_INITIAL_DELAY
+        return min(max(p95, config.HEDGE_MIN_DELAY), config.HEDGE_MAX_DELAY)
+
+    def earn(self):
+        """Called once per hedgeable job."""
+        self.jobs += 1
+        self.tokens = min(self.burst, self.tokens + self.budget)
+
+    def take(self) -> bool:
+        if self.tokens < 1:
+            self.skipped_budget += 1
+            return False
+        self.tokens -= 1
+        self.launched += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "delay_s": round(self.delay(), 2),
+            "hedge_rate": round(self.launched / self.jobs, 4) if self.jobs else 0.0,
+            "launched": self.launched,
+            "won": self.won,
+            "lost": self.lost,
+            "skipped_budget": self.skipped_budget,
+            "skipped_capacity": self.skipped_capacity,
+            "budget_tokens": round(self.tokens, 2),
+        }
+
+hedge_policy = HedgePolicy()
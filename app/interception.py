@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from playwright.async_api import BrowserContext, Route, Request
+from app.config import config
+from app.logger import logger
+
+# Bundles whose file name carries a content hash never change under the same URL
+HASHED_ASSET_RE = re.compile(r"[.\-_][0-9a-f]{8,}(\.[a-z]+)?\.(js|mjs|css)$", re.IGNORECASE)
+CACHEABLE_RESOURCE_TYPES = {"script", "stylesheet"}
+BLOCK_URL_PATTERNS = [re.compile(pattern) for pattern in config.NETWORK_BLOCK_URL_PATTERNS]
+# Describe the original encoding/size, which no longer apply to the decoded body we replay
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "date", "set-cookie"}
+
+class InterceptionStats:
+    """Network savings for one context (i.e. one prepared page)."""
+    def __init__(self):
+        self.requests = 0
+        self.blocked = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes_saved = 0
+        self.time_saved_ms = 0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+class AssetCache:
+    """
+    Shared on-disk cache of immutable static assets. Bodies are stored under their
+    SHA-256 so URLs with identical content share one file; an index maps URLs to
+    digests in least-recently-used order and is trimmed to ASSET_CACHE_MAX_MB.
+    The index is persisted at most every ASSET_CACHE_SAVE_INTERVAL seconds and on `flush`.
+    """
+    def __init__(self, directory: str = config.ASSET_CACHE_DIR, max_bytes: int = config.ASSET_CACHE_MAX_MB * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # url -> (digest, size, headers, fetch_ms)
+        self.index: "OrderedDict[str, Tuple[str, int, Dict[str, str], int]]" = OrderedDict()
+        self.total_bytes = 0
+        # digest -> number of URLs whose body it is; a blob counts towards total_bytes once
+        self.refs: Dict[str, int] = {}
+        self.totals = InterceptionStats()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._saved_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            try:
+                with open(self._index_path(), encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = []
+            for url, digest, size, headers, fetch_ms in entries:
+                if os.path.exists(self._blob_path(digest)):
+                    self._add(url, (digest, size, headers, fetch_ms))
+            self._saved_at = time.time()
+
+    def _add(self, url: str, entry: Tuple[str, int, Dict[str, str], int]):
+        old = self.index.get(url)
+        if old and self._drop_ref(old) and old[0] != entry[0]:
+            try:
+                os.remove(self._blob_path(old[0]))
+            except OSError:
+                pass
+        self.index[url] = entry
+        self.index.move_to_end(url)
+        digest, size = entry[0], entry[1]
+        self.refs[digest] = self.refs.get(digest, 0) + 1
+        if self.refs[digest] == 1:
+            self.total_bytes += size
+
+    def _drop_ref(self, entry: Tuple[str, int, Dict[str, str], int]) -> bool:
+        """Returns True when no URL uses the blob any more."""
+        digest, size = entry[0], entry[1]
+        self.refs[digest] -= 1
+        if self.refs[digest]:
+            return False
+        del self.refs[digest]
+        self.total_bytes -= size
+        return True
+
+    def _save_index(self):
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([[url, *entry] for url, entry in self.index.items()], f)
+        os.replace(tmp_path, self._index_path())
+        self._dirty = False
+        self._saved_at = time.time()
+
+    def flush(self):
+        """Persists the index if it changed since the last save, e.g. at shutdown."""
+        if not self._loaded:
+            return
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def read(self, url: str) -> Optional[Tuple[bytes, Dict[str, str], int]]:
+        """Returns (body, headers, fetch_ms) for a cached URL."""
+        self._load()
+        with self._lock:
+            entry = self.index.get(url)
+            if not entry:
+                return None
+            self.index.move_to_end(url)
+        digest, _, headers, fetch_ms = entry
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                return f.read(), headers, fetch_ms
+        except OSError:
+            with self._lock:
+                if self.index.get(url) == entry:
+                    self._drop_ref(self.index.pop(url))
+                    self._dirty = True
+            return None
+
+    def write(self, url: str, body: bytes, headers: Dict[str, str], fetch_ms: int):
+        self._load()
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(body)
+                os.replace(path + ".tmp", path)
+            self._add(url, (digest, len(body), headers, fetch_ms))
+            self._evict()
+            self._dirty = True
+            if time.time() - self._saved_at >= config.ASSET_CACHE_SAVE_INTERVAL:
+                self._save_index()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.index:
+            _, entry = self.index.popitem(last=False)
+            if self._drop_ref(entry):
+                try:
+                    os.remove(self._blob_path(entry[0]))
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self.index), "bytes": self.total_bytes, **self.totals.as_dict()}
+
+asset_cache = AssetCache()
+
+def _is_blocked(request: Request) -> bool:
+    if request.resource_type in config.NETWORK_BLOCK_RESOURCE_TYPES:
+        return True
+    return any(pattern.search(request.url) for pattern in BLOCK_URL_PATTERNS)
+
+def _is_cacheable(request: Request) -> bool:
+    if not asset_cache.enabled or request.method != "GET":
+        return False
+    if request.resource_type not in CACHEABLE_RESOURCE_TYPES:
+        return False
+    return bool(HASHED_ASSET_RE.search(request.url.split("?", 1)[0]))
+
+async def install_interception(context: BrowserContext) -> InterceptionStats:
+    """
+    Routes all requests of the context through the blocklist and the asset cache.
+    Returns the stats object that is updated as the context loads pages.
+    """
+    stats = InterceptionStats()
+
+    def count(field: str, value: int = 1):
+        setattr(stats, field, getattr(stats, field) + value)
+        setattr(asset_cache.totals, field, getattr(asset_cache.totals, field) + value)
+
+    async def handle(route: Route, request: Request):
+        count("requests")
+        try:
+            if _is_blocked(request):
+                count("blocked")
+                await route.abort("blockedbyclient")
+                return
+
+            if not _is_cacheable(request):
+                await route.continue_()
+                return
+
+            cached = await asyncio.to_thread(asset_cache.read, request.url)
+            if cached:
+                body, headers, fetch_ms = cached
+                count("cache_hits")
+                count("bytes_saved", len(body))
+                count("time_saved_ms", fetch_ms)
+                await route.fulfill(status=200, headers=headers, body=body)
+                return
+
+            count("cache_misses")
+            started = time.time()
+            response = await route.fetch()
+            body = await response.body()
+            fetch_ms = int((time.time() - started) * 1000)
+            await route.fulfill(response=response, body=body)
+            if response.status == 200:
+                headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+                await asyncio.to_thread(asset_cache.write, request.url, body, headers, fetch_ms)
+        except Exception as e:
+            # The page may have closed mid-request; fall back to the network where possible
+            logger.debug("Request interception failed for %s: %s", request.url, e)
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+
+    await context.route("**/*", handle)
+    return stats
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from app.config import config
+from app.models import GenerateRequest, GenerateResponse, TaskStatus, JobStatusResponse
+from app.logger import logger
+from app.queue_manager import queue_manager, Job
+
+class JobRecord:
+    def __init__(self, job_id: str, request: GenerateRequest, created_at: float):
+        self.job_id = job_id
+        self.request = request
+        self.created_at = created_at
+        self.result: Optional[GenerateResponse] = None
+        self.finished_at: Optional[float] = None
+        self.job: Optional[Job] = None
+        self.done = asyncio.Event()
+
+    def status(self) -> JobStatusResponse:
+        if self.result:
+            status = self.result.status
+        elif self.job and self.job.task:
+            status = TaskStatus.PROCESSING
+        else:
+            status = TaskStatus.PENDING
+        return JobStatusResponse(
+            job_id=self.job_id,
+            status=status,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+            result=self.result
+        )
+
+class JobStore:
+    """
+    Asynchronous jobs backed by an append-only JSONL journal. Every submission and
+    result is appended (and fsynced) before it is acknowledged, so jobs without a
+    result are replayed after a restart. Old results are compacted away on a schedule.
+    """
+    def __init__(self, path: str = config.JOB_JOURNAL_PATH):
+        self.path = path
+        self.records: Dict[str, JobRecord] = {}
+        self._file_lock = threading.Lock()
+        self._compact_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        pending = await asyncio.to_thread(self._load)
+        for record in pending:
+            logger.info("Replaying journaled job %s", record.job_id, extra={"request_id": record.job_id})
+            await self._enqueue(record)
+        self._compact_task = asyncio.create_task(self._compact_loop())
+
+    async def stop(self):
+        if self._compact_task:
+            self._compact_task.cancel()
+
+    def _load(self) -> List[JobRecord]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    continue
+                if entry["op"] == "submit":
+                    request = GenerateRequest.model_validate(entry["request"])
+                    self.records[entry["job_id"]] = JobRecord(entry["job_id"], request, entry["ts"])
+                elif entry["op"] == "result" and entry["job_id"] in self.records:
+                    record = self.records[entry["job_id"]]
+                    record.result = GenerateResponse.model_validate(entry["result"])
+                    record.finished_at = entry["ts"]
+                    record.done.set()
+        logger.info("Loaded job journal", extra={"props": {"jobs": len(self.records)}})
+        return [record for record in self.records.values() if record.result is None]
+
+    def _append(self, entry: dict):
+        line = json.dumps(entry) + "\n"
+        with self._file_lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                if config.JOB_JOURNAL_FSYNC:
+                    os.fsync(f.fileno())
+
+    async def submit(self, request: GenerateRequest) -> JobRecord:
+        record = JobRecord(str(uuid.uuid4()), request, time.time())
+        # Cached and in-flight answers are resolved before admission, as for /generate;
+        # a rejected job raises here, before anything is journaled, so it is never replayed
+        job = await queue_manager.submit(request, record.job_id)
+        # Registered before journaling so a concurrent compaction cannot drop it
+        self.records[record.job_id] = record
+        try:
+            await asyncio.to_thread(self._append, {
+                "op": "submit",
+                "job_id": record.job_id,
+                "ts": record.created_at,
+                "request": request.model_dump(mode="json")
+            })
+        except Exception:
+            del self.records[record.job_id]
+            job.release()
+            raise
+        # Only now, so the result is never journaled ahead of the submission
+        self._track(record, job)
+        return record
+
+    async def _enqueue(self, record: JobRecord):
+        # Already admitted when it was first accepted
+        self._track(record, await queue_manager.submit(record.request, record.job_id, admit=False))
+
+    def _track(self, record: JobRecord, job: Job):
+        record.job = job
+        job.future.add_done_callback(lambda future: asyncio.create_task(self._on_done(record, future)))
+
+    async def _on_done(self, record: JobRecord, future: asyncio.Future):
+        if future.cancelled():
+            # Left unfinished in the journal, so it is replayed on the next start
+            return
+        result = future.result()
+        timings = result.timings if record.request.include_timings else None
+        if result.request_id != record.job_id or result.timings != timings:
+            result = result.model_copy(update={"request_id": record.job_id, "timings": timings})
+        record.result = result
+        record.finished_at = time.time()
+        record.job = None
+        try:
+            await asyncio.to_thread(self._append, {
+                "op": "result",
+                "job_id": record.job_id,
+                "ts": record.finished_at,
+                "result": result.model_dump(mode="json")
+            })
+        except Exception as e:
+            logger.error("Failed to journal job result: %s", e, extra={"request_id": record.job_id})
+        record.done.set()
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        return self.records.get(job_id)
+
+    async def wait(self, record: JobRecord, timeout: float) -> JobStatusResponse:
+        """Long-poll: returns as soon as the job finishes, or its current status after `timeout`."""
+        try:
+            await asyncio.wait_for(record.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return record.status()
+
+    def _compact(self, cutoff: float) -> List[str]:
+        """Rewrites the journal without results older than `cutoff`; returns the dropped job ids."""
+        # Records are registered in memory before they are journaled, so a snapshot
+        # taken under the file lock never misses an entry that was already appended.
+        with self._file_lock:
+            records = list(self.records.values())
+            expired = [record.job_id for record in records if record.finished_at and record.finished_at < cutoff]
+
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    if record.finished_at and record.finished_at < cutoff:
+                        continue
+                    f.write(json.dumps({"op": "submit", "job_id": record.job_id, "ts": record.created_at, "request": record.request.model_dump(mode="json")}) + "\n")
+                    if record.result:
+                        f.write(json.dumps({"op": "result", "job_id": record.job_id, "ts": record.finished_at, "result": record.result.model_dump(mode="json")}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        return expired
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(config.JOB_COMPACT_INTERVAL)
+            try:
+                expired = await asyncio.to_thread(self._compact, time.time() - config.JOB_RESULT_TTL)
+                for job_id in expired:
+                    self.records.pop(job_id, None)
+                logger.info("Compacted job journal", extra={"props": {"removed": len(expired), "jobs": len(self.records)}})
+            except Exception as e:
+                logger.error("Job journal compaction failed: %s", e)
+
+    def stats(self) -> dict:
+        pending = sum(1 for record in self.records.values() if record.result is None)
+        return {"jobs": len(self.records), "pending": pending}
+
+job_store = JobStore()
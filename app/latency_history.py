@@ -0,0 +1,151 @@
+import os
+from typing import Dict, List, Optional
+from app.config import config
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with the P-square algorithm (Jain and
+    Chlamtac): five markers are nudged towards their ideal positions on every
+    observation, so memory and time per observation are constant.
+    """
+    def __init__(self, q: float):
+        self.q = q
+        self.count = 0
+        self.heights: List[float] = []
+        self.positions = [0.0, 1.0, 2.0, 3.0, 4.0]
+        self.desired = [0.0, 2 * q, 4 * q, 2 + 2 * q, 4.0]
+        self.increments = [0.0, q / 2, q, (1 + q) / 2, 1.0]
+
+    def add(self, x: float):
+        self.count += 1
+        h = self.heights
+        if len(h) < 5:
+            h.append(x)
+            h.sort()
+            return
+
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if h[i] <= x < h[i + 1])
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Piecewise-parabolic prediction, or linear if that leaves the neighbours' range
+                height = h[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not h[i - 1] < height < h[i + 1]:
+                    height = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = height
+                n[i] += d
+
+    def value(self) -> Optional[float]:
+        if not self.heights:
+            return None
+        if self.count < 5:
+            return self.heights[min(int(self.q * self.count), self.count - 1)]
+        return self.heights[2]
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class StageHistory:
+    """
+    Quantile estimates for one stage. Estimators start over every
+    LATENCY_HISTORY_WINDOW observations and the previous generation answers
+    until the new one has ADAPTIVE_MIN_SAMPLES, so old latencies age out.
+    """
+    def __init__(self):
+        self.current = {q: P2Quantile(q) for q in QUANTILES}
+        self.previous: Optional[Dict[float, P2Quantile]] = None
+        self.observed = 0
+
+    def add(self, seconds: float):
+        self.observed += 1
+        if self.current[QUANTILES[0]].count >= config.LATENCY_HISTORY_WINDOW:
+            self.previous = self.current
+            self.current = {q: P2Quantile(q) for q in QUANTILES}
+        for estimator in self.current.values():
+            estimator.add(seconds)
+
+    def samples(self) -> int:
+        return max(self.current[QUANTILES[0]].count, self.previous[QUANTILES[0]].count if self.previous else 0)
+
+    def quantile(self, q: float) -> Optional[float]:
+        estimators = self.current
+        if estimators[q].count < config.ADAPTIVE_MIN_SAMPLES and self.previous:
+            estimators = self.previous
+        if estimators[q].count < config.ADAPTIVE_MIN_SAMPLES:
+            return None
+        return estimators[q].value()
+
+    def stats(self) -> dict:
+        values = {f"p{int(q * 100)}_ms": self.quantile(q) for q in QUANTILES}
+        return {
+            "observed": self.observed,
+            **{key: round(value * 1000, 1) if value is not None else None for key, value in values.items()},
+        }
+
+class LatencyHistory:
+    """
+    Per-stage latency quantiles (navigation, input discovery, time to first
+    token, inter-token gap, whole request) and the timeouts and poll intervals
+    derived from them. Each value in ADAPTIVE_RULES is `factor` times a stage
+    quantile, clamped to its floor and ceiling; until the stage has enough
+    samples, or when the value is set in the environment, the Config value is used.
+    """
+    def __init__(self, rules: dict = config.ADAPTIVE_RULES):
+        self.rules = rules
+        self.stages: Dict[str, StageHistory] = {}
+
+    def observe(self, stage: str, seconds: float):
+        history = self.stages.get(stage)
+        if history is None:
+            history = self.stages[stage] = StageHistory()
+        history.add(seconds)
+
+    def _resolve(self, name: str) -> tuple:
+        default = getattr(config, name)
+        if name in os.environ or not config.ADAPTIVE_TIMEOUTS:
+            return default, "env" if name in os.environ else "config"
+        stage, q, factor, floor, ceiling = self.rules[name]
+        history = self.stages.get(stage)
+        estimate = history.quantile(q) if history else None
+        if estimate is None:
+            return default, "default"
+        return min(max(estimate * factor, floor), ceiling), "learned"
+
+    def get(self, name: str) -> float:
+        """Current value of a timeout or poll interval named in ADAPTIVE_RULES (seconds)."""
+        return self._resolve(name)[0]
+
+    def stats(self) -> dict:
+        values = {}
+        for name, (stage, q, factor, floor, ceiling) in self.rules.items():
+            value, source = self._resolve(name)
+            values[name] = {
+                "value_s": round(value, 3),
+                "source": source,
+                "rule": f"{factor} x p{int(q * 100)}({stage})",
+                "floor_s": floor,
+                "ceiling_s": ceiling,
+            }
+        return {
+            "adaptive": config.ADAPTIVE_TIMEOUTS,
+            "values": values,
+            "stages": {stage: history.stats() for stage, history in self.stages.items()},
+        }
+
+latency_history = LatencyHistory()
@@ -1,8 +1,21 @@
+import atexit
 import logging
+import logging.handlers
 import json
-import time
+import queue
+import threading
 import sys
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
+from app.config import config
+
+try:
+    import orjson
+
+    def _dumps(obj: Dict[str, Any]) -> str:
+        return orjson.dumps(obj, default=str).decode()
+except ImportError:
+    def _dumps(obj: Dict[str, Any]) -> str:
+        return json.dumps(obj, default=str)
 
 class JSONFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
@@ -13,29 +26,81 @@ class JSONFormatter(logging.Formatter):
             "module": record.module,
             "function": record.funcName,
         }
-        
+
         if hasattr(record, "request_id"):
             log_obj["request_id"] = record.request_id
-            
+
         if hasattr(record, "props"):
              log_obj.update(record.props)
 
+        if hasattr(record, "suppressed"):
+            log_obj["suppressed"] = record.suppressed
+
         if record.exc_info:
             log_obj["exception"] = self.formatException(record.exc_info)
 
-        return json.dumps(log_obj)
+        return _dumps(log_obj)
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits repeated messages per call site: the first `burst` records in each
+    `window` pass, after that only one in `sample`. The next record that passes
+    carries how many were suppressed. Errors are never dropped.
+    """
+    def __init__(self, burst: int, window: float, sample: int):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sample = sample
+        # call site -> [window start, records seen, suppressed since last emitted]
+        self.sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            site = self.sites.get(key)
+            if site is None or now - site[0] > self.window:
+                suppressed = site[2] if site else 0
+                site = self.sites[key] = [now, 0, suppressed]
+            site[1] += 1
+            if site[1] > self.burst and (site[1] - self.burst) % self.sample:
+                site[2] += 1
+                return False
+            if site[2]:
+                record.suppressed = site[2]
+                site[2] = 0
+        return True
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues the record untouched; message formatting and JSON encoding happen on the listener thread."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
 
 def setup_logger(name: str = "app_logger") -> logging.Logger:
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
+    logger.setLevel(getattr(logging, config.LOG_LEVEL, logging.INFO))
+
     # Prevent adding multiple handlers if setup is called multiple times
     if not logger.handlers:
         handler = logging.StreamHandler(sys.stdout)
         formatter = JSONFormatter()
         handler.setFormatter(formatter)
+
+        if config.LOG_ASYNC:
+            # A slow stdout consumer then only delays the listener thread, not the event loop
+            listener = logging.handlers.QueueListener(queue.SimpleQueue(), handler)
+            listener.start()
+            atexit.register(listener.stop)
+            handler = DeferredQueueHandler(listener.queue)
+
+        if config.LOG_RATE_LIMIT_BURST:
+            handler.addFilter(RateLimitFilter(config.LOG_RATE_LIMIT_BURST, config.LOG_RATE_LIMIT_WINDOW, config.LOG_RATE_LIMIT_SAMPLE))
         logger.addHandler(handler)
-        
+
     return logger
 
 logger = setup_logger()
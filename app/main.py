@@ -1,18 +1,260 @@
-from fastapi import FastAPI, HTTPException
-from app.models import GenerateRequest, GenerateResponse
-from app.queue_manager import queue_manager
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from app.config import config
+from app.models import (
+    GenerateRequest, GenerateResponse, TaskStatus,
+    BatchGenerateRequest, BatchGenerateResponse, BatchItemResult, BatchStatusResponse,
+    JobSubmitResponse, JobStatusResponse
+)
+from app.queue_manager import queue_manager, Job, AdmissionRejected
+from app.browser_pool import browser_pool
+from app.page_pool import page_pool
+from app.dispatcher import dispatcher
+from app.interception import asset_cache
+from app.page_probe import prompt_ranker, send_ranker
+from app.metrics import metrics
+from app.hedging import hedge_policy
+from app.profiler import profiler, write_dump
+from app.latency_history import latency_history
+from app.circuit_breaker import circuit_breaker, CLOSED, HALF_OPEN
+from app.artifacts import artifact_writer
+from app.response_cache import response_cache, prompt_key
+from app.job_store import job_store
 from app.logger import logger
 import uuid
 
-app = FastAPI(title="Local ChatGPT API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    profiler.start()
+    if dispatcher.enabled:
+        # Browsers live in separate host processes
+        await dispatcher.start()
+    else:
+        # Browsers are launched once and shared by all requests
+        await browser_pool.start()
+        await page_pool.start()
+    await queue_manager.start()
+    # Replays jobs that were journaled but never finished
+    await job_store.start()
+    yield
+    await job_store.stop()
+    await queue_manager.stop()
+    if dispatcher.enabled:
+        await dispatcher.stop()
+    else:
+        await page_pool.stop()
+        await browser_pool.stop()
+    profiler.stop()
+
+app = FastAPI(title="Local ChatGPT API", version="1.0.0", lifespan=lifespan)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.message, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 @app.post("/generate", response_model=GenerateResponse)
-async def generate(request: GenerateRequest):
+async def generate(request: GenerateRequest, http_request: Request):
+    request_id = str(uuid.uuid4())
+    logger.info("Received request", extra={"request_id": request_id, "props": {"prompt_hash": prompt_key(request.prompt)[:16]}})
+
+    job = await queue_manager.submit(request, request_id)
+    watcher = asyncio.create_task(_release_on_disconnect(http_request, job, request_id))
+    try:
+        return await queue_manager.wait(job, request_id, request.include_timings)
+    finally:
+        watcher.cancel()
+
+async def _release_on_disconnect(http_request: Request, job: Job, request_id: str):
+    """Gives up our share of the job when the client disconnects, so it is dropped before reaching a browser."""
+    while not job.future.done():
+        if await http_request.is_disconnected():
+            logger.info("Client disconnected, releasing job", extra={"request_id": request_id})
+            job.release()
+            return
+        await asyncio.sleep(config.DISCONNECT_POLL_INTERVAL)
+
+@app.post("/generate/stream")
+async def generate_stream(request: GenerateRequest):
+    """
+    Server-Sent Events stream of the answer: `chunk` events carry appended text,
+    `reset` events replace the text so far, and a final `done` event carries the
+    GenerateResponse. Disconnecting cancels the browser job.
+    """
     request_id = str(uuid.uuid4())
-    logger.info("Received request", extra={"request_id": request_id, "prompt_hash": hash(request.prompt)})
-    
-    return await queue_manager.enqueue(request, request_id)
-    
+    logger.info("Received streaming request", extra={"request_id": request_id, "props": {"prompt_hash": prompt_key(request.prompt)[:16]}})
+
+    job = await queue_manager.submit(request, request_id)
+    channel = job.subscribe()
+
+    async def event_stream():
+        try:
+            yield _sse("start", {"request_id": request_id})
+            while True:
+                event, data = await channel.get()
+                if event == "done":
+                    data = {**data, "request_id": request_id}
+                    if not request.include_timings:
+                        data["timings"] = None
+                yield _sse(event, data)
+                if event == "done":
+                    break
+        finally:
+            job.unsubscribe(channel)
+            if not job.future.done():
+                logger.info("Streaming client disconnected, releasing job", extra={"request_id": request_id})
+                job.release()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate/batch", response_model=BatchGenerateResponse)
+async def generate_batch(batch_request: BatchGenerateRequest, http_request: Request):
+    """
+    Runs many prompts as one unit across the worker pool. Results come back in
+    prompt order, or as NDJSON lines in completion order when `stream` is set;
+    each item reports its own success or failure.
+    """
+    # Every queue slot holds one prompt, or BATCH_PROMPTS_PER_PAGE with reuse_page; a larger batch could never be admitted
+    group_size = config.BATCH_PROMPTS_PER_PAGE if batch_request.reuse_page else 1
+    max_prompts = min(config.BATCH_MAX_PROMPTS, config.MAX_QUEUE_SIZE * group_size)
+    if len(batch_request.prompts) > max_prompts:
+        raise HTTPException(status_code=413, detail=f"At most {max_prompts} prompts per batch")
+
+    batch_id = str(uuid.uuid4())
+    logger.info("Received batch request", extra={"props": {"batch_id": batch_id, "prompts": len(batch_request.prompts)}})
+
+    requests = [
+        GenerateRequest(prompt=prompt, cache=batch_request.cache, priority=batch_request.priority, deadline_s=batch_request.deadline_s)
+        for prompt in batch_request.prompts
+    ]
+    batch = await queue_manager.submit_batch(requests, batch_id, reuse_page=batch_request.reuse_page)
+
+    if batch_request.stream:
+        async def result_stream():
+            pending = {asyncio.ensure_future(_indexed_result(index, job, f"{batch_id}-{index}")) for index, job in enumerate(batch.jobs)}
+            try:
+                for next_done in asyncio.as_completed(pending):
+                    item = await next_done
+                    yield item.model_dump_json() + "\n"
+                yield batch.status().model_dump_json() + "\n"
+            finally:
+                for task in pending:
+                    task.cancel()
+
+        return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+    # Each item releases its own job when the gather is cancelled on disconnect
+    gathered = asyncio.gather(*(queue_manager.wait(job, f"{batch_id}-{index}") for index, job in enumerate(batch.jobs)))
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, gathered, batch_id))
+    try:
+        results = await gathered
+    finally:
+        watcher.cancel()
+
+    succeeded = sum(1 for result in results if result.status == TaskStatus.COMPLETED)
+    return BatchGenerateResponse(batch_id=batch_id, results=results, succeeded=succeeded, failed=len(results) - succeeded)
+
+async def _cancel_on_disconnect(http_request: Request, waiting: asyncio.Future, batch_id: str):
+    """Cancels the wait for a batch's results when the client disconnects, since Starlette does not."""
+    while not waiting.done():
+        if await http_request.is_disconnected():
+            logger.info("Client disconnected, releasing batch", extra={"props": {"batch_id": batch_id}})
+            waiting.cancel()
+            return
+        await asyncio.sleep(config.DISCONNECT_POLL_INTERVAL)
+
+@app.get("/generate/batch/{batch_id}", response_model=BatchStatusResponse)
+async def batch_status(batch_id: str):
+    batch = queue_manager.batches.get(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Unknown or finished batch")
+    return batch.status()
+
+async def _indexed_result(index: int, job: Job, request_id: str) -> BatchItemResult:
+    return BatchItemResult(index=index, result=await queue_manager.wait(job, request_id))
+
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(request: GenerateRequest):
+    """Journals the request and returns immediately; poll /jobs/{job_id} for the result."""
+    record = await job_store.submit(request)
+    logger.info("Accepted job", extra={"request_id": record.job_id, "props": {"prompt_hash": prompt_key(request.prompt)[:16]}})
+    return JobSubmitResponse(job_id=record.job_id, status=record.status().status)
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    record = job_store.get(job_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return record.status()
+
+@app.get("/jobs/{job_id}/wait", response_model=JobStatusResponse)
+async def wait_job(job_id: str, timeout: float = Query(30, ge=0, le=config.JOB_LONG_POLL_MAX)):
+    """Long-poll: answers as soon as the job finishes or after `timeout` seconds."""
+    record = job_store.get(job_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return await job_store.wait(record, timeout)
+
+# Read at scrape time from the components that already keep these numbers
+metrics.gauge("ghostapi_queue_size", "Jobs waiting for a worker", lambda: queue_manager.queue.qsize())
+metrics.gauge("ghostapi_jobs_running", "Jobs holding a browser context", lambda: queue_manager.running)
+metrics.gauge("ghostapi_workers", "Live queue workers", lambda: queue_manager.active_workers)
+metrics.gauge("ghostapi_hot_pages", "Prepared pages waiting for a request", lambda: page_pool.ready.qsize())
+metrics.gauge("ghostapi_session_pages", "Tabs parked with a session's conversation", lambda: len(page_pool.sessions))
+metrics.gauge("ghostapi_circuit_state", "Circuit breaker: 0 closed, 1 half-open, 2 open", lambda: {CLOSED: 0, HALF_OPEN: 1}.get(circuit_breaker.state, 2))
+metrics.gauge("ghostapi_event_loop_lag_p99_seconds", "99th percentile event-loop lag over the recent samples", lambda: profiler.lag.percentile(0.99))
+metrics.gauge("ghostapi_hedge_delay_seconds", "Seconds without text after which a job is hedged", hedge_policy.delay)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition: per-stage latency histograms, outcomes per FailureReason and pool gauges."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def debug_profile(top: int = Query(20, ge=1, le=1000), reset: bool = False):
+    """Event-loop lag, Playwright calls by method, call site and request, ranked by total time."""
+    snapshot = profiler.snapshot(top)
+    if reset:
+        profiler.reset()
+    return snapshot
+
+@app.post("/debug/profile/dump")
+async def dump_profile():
+    """Writes the full profile to PROFILE_DUMP_DIR as JSON."""
+    # Snapshot on the loop so the thread never reads counters the loop is mutating
+    snapshot = profiler.snapshot(top=1000)
+    path = await asyncio.to_thread(write_dump, snapshot)
+    return {"path": path}
+
+@app.get("/debug/timeouts")
+async def debug_timeouts():
+    """Timeouts and poll intervals in effect, where each comes from, and the stage quantiles behind them."""
+    return latency_history.stats()
+
 @app.get("/health")
 async def health():
-    return {"status": "ok", "active_workers": queue_manager.active_workers, "queue_size": queue_manager.queue.qsize()}
+    return {
+        "status": "ok" if circuit_breaker.state == CLOSED else "degraded",
+        "active_workers": queue_manager.active_workers,
+        "queue_size": queue_manager.queue.qsize(),
+        "queue": queue_manager.stats(),
+        "browser_pool": dispatcher.stats() if dispatcher.enabled else browser_pool.stats(),
+        "hot_pages": page_pool.ready.qsize(),
+        "page_pool": page_pool.stats(),
+        "network": asset_cache.stats(),
+        "selectors": {"prompt": prompt_ranker.stats(), "send": send_ranker.stats()},
+        "circuit_breaker": circuit_breaker.stats(),
+        "hedging": hedge_policy.stats(),
+        "cache": {**response_cache.stats(), "coalesced": queue_manager.coalesced},
+        "jobs": job_store.stats(),
+        "artifacts": artifact_writer.stats(),
+    }
@@ -0,0 +1,87 @@
+import os
+from typing import List, Optional, Set
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return children
+
+def process_tree_pids(pid: int) -> List[int]:
+    pids = [pid]
+    i = 0
+    while i < len(pids):
+        pids.extend(child_pids(pids[i]))
+        i += 1
+    return pids
+
+def process_memory(pid: int) -> int:
+    """
+    Memory attributed to a process in bytes. Uses PSS where available so that
+    pages shared between Chromium renderers are not counted once per process.
+    """
+    for path, key in ((f"/proc/{pid}/smaps_rollup", "Pss:"), (f"/proc/{pid}/status", "VmRSS:")):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(key):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return 0
+
+def process_tree_memory(pid: int) -> int:
+    return sum(process_memory(p) for p in process_tree_pids(pid))
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+def host_memory_available_fraction() -> float:
+    """
+    Fraction of memory still available to this container or host, honouring
+    cgroup limits when running under Docker.
+    """
+    meminfo = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                meminfo[key] = int(value.split()[0]) * 1024
+    except OSError:
+        return 1.0
+    total = meminfo.get("MemTotal", 0)
+
+    for limit_path, usage_path in (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),
+    ):
+        limit = _read_int(limit_path)
+        usage = _read_int(usage_path)
+        if limit and usage is not None and limit < total:
+            return max(limit - usage, 0) / limit
+
+    if not total:
+        return 1.0
+    return meminfo.get("MemAvailable", total) / total
+
+def chromium_root_pids(pid: int) -> Set[int]:
+    """Browser (not renderer/GPU/utility) Chromium processes below `pid`."""
+    roots = set()
+    for child in process_tree_pids(pid)[1:]:
+        try:
+            with open(f"/proc/{child}/cmdline", "rb") as f:
+                args = f.read().decode(errors="ignore").split("\0")
+        except OSError:
+            continue
+        if "chrom" in os.path.basename(args[0]).lower() and not any(arg.startswith("--type=") for arg in args):
+            roots.add(child)
+    return roots
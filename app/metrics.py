@@ -0,0 +1,91 @@
+import bisect
+import math
+from typing import Callable, Dict, List, Tuple
+
+# Seconds; spans fast cache answers up to the global hard limit
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram; `observe` is a bisect and two additions."""
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + [math.inf], counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                labels = _labels(self.labels, label_values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+class Gauge:
+    """Read from a callback at scrape time, so nothing is recorded on the hot path."""
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+class Metrics:
+    """Minimal Prometheus registry rendered in the text exposition format at /metrics."""
+    def __init__(self):
+        self.stage_seconds = Histogram("ghostapi_stage_seconds", "Time spent in each request stage", ("stage",))
+        self.request_seconds = Histogram("ghostapi_request_seconds", "End-to-end request latency including queue wait", ("status",))
+        self.requests = Counter("ghostapi_requests_total", "Finished requests by outcome", ("status", "failure_reason"))
+        self.hedges = Counter("ghostapi_hedges_total", "Hedged second attempts: launched, won by the hedge, lost to the primary", ("outcome",))
+        self.cache_hits = Counter("ghostapi_cache_hits_total", "Response cache hits")
+        self.cache_misses = Counter("ghostapi_cache_misses_total", "Response cache misses")
+        self.coalesced = Counter("ghostapi_coalesced_requests_total", "Requests that joined an identical in-flight request")
+        self.gauges: List[Gauge] = []
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]):
+        self.gauges.append(Gauge(name, help, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in [self.stage_seconds, self.request_seconds, self.requests, self.hedges, self.cache_hits, self.cache_misses, self.coalesced, *self.gauges]:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional
+from typing import Annotated, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 class TaskStatus(str, Enum):
@@ -15,9 +15,21 @@ class FailureReason(str, Enum):
     FAIL_CAPTCHA = "FAIL_CAPTCHA"
     FAIL_UI_CHANGE = "FAIL_UI_CHANGE"
     FAIL_UNKNOWN = "FAIL_UNKNOWN"
+    FAIL_CACHE_MISS = "FAIL_CACHE_MISS"
+    FAIL_CIRCUIT_OPEN = "FAIL_CIRCUIT_OPEN"
+
+class CacheMode(str, Enum):
+    BYPASS = "bypass"  # Always run in a browser (the fresh result is still cached)
+    PREFER = "prefer"  # Use a cached or in-flight result when there is one
+    ONLY = "only"      # Never run in a browser; fail with FAIL_CACHE_MISS if not cached
 
 class GenerateRequest(BaseModel):
     prompt: str = Field(..., min_length=1, description="The prompt to send to ChatGPT")
+    cache: CacheMode = Field(CacheMode.PREFER, description="How to use the response cache for this prompt")
+    priority: int = Field(0, ge=-10, le=10, description="Higher priorities are served first")
+    deadline_s: Optional[float] = Field(None, gt=0, description="Seconds the client is willing to wait; rejected up front if the estimated wait is longer")
+    include_timings: bool = Field(False, description="Add a per-stage latency breakdown to the response")
+    session_id: Optional[str] = Field(None, min_length=1, max_length=128, description="Continue the conversation of earlier requests with the same session_id in the same tab")
 
 class GenerateResponse(BaseModel):
     request_id: str
@@ -26,3 +38,41 @@ class GenerateResponse(BaseModel):
     failure_reason: Optional[FailureReason] = None
     error_message: Optional[str] = None
     latency_ms: Optional[int] = None
+    cached: bool = False
+    timings: Optional[Dict[str, int]] = Field(None, description="Milliseconds per stage, when include_timings was set")
+
+class BatchGenerateRequest(BaseModel):
+    prompts: List[Annotated[str, Field(min_length=1)]] = Field(..., min_length=1, description="Prompts to run, answered in the same order")
+    cache: CacheMode = Field(CacheMode.PREFER, description="How to use the response cache for every prompt")
+    stream: bool = Field(False, description="Stream NDJSON results as they finish instead of waiting for all of them")
+    reuse_page: bool = Field(False, description="Send several prompts in a row on one page instead of one page per prompt")
+    priority: int = Field(0, ge=-10, le=10, description="Priority of every prompt in the batch")
+    deadline_s: Optional[float] = Field(None, gt=0, description="Seconds the client is willing to wait for each prompt")
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: GenerateResponse
+
+class BatchGenerateResponse(BaseModel):
+    batch_id: str
+    results: List[GenerateResponse]
+    succeeded: int
+    failed: int
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    total: int
+    pending: int
+    succeeded: int
+    failed: int
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: TaskStatus
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: TaskStatus
+    created_at: float
+    finished_at: Optional[float] = None
+    result: Optional[GenerateResponse] = None
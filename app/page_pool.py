@@ -0,0 +1,433 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Set
+from playwright.async_api import Browser, BrowserContext, Page, Locator
+from playwright_stealth import stealth_async
+from app.config import config
+from app.models import FailureReason
+from app.logger import logger
+from app.browser_pool import browser_pool
+from app.artifacts import take_screenshot, dump_html
+from app.dom_observer import DOMObserver
+from app.interception import asset_cache, install_interception, InterceptionStats
+from app.page_probe import probe_page
+from app.metrics import metrics
+from app.latency_history import latency_history
+from app.circuit_breaker import circuit_breaker, OPEN
+
+CHAT_URL = config.CHAT_URL
+
+# Every context gets its own isolated cookies/storage with these settings
+CONTEXT_OPTIONS = {
+    "viewport": {"width": 1280, "height": 720},
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    # Requests answered by a service worker would bypass request interception
+    "service_workers": "block",
+}
+
+class PagePreparationError(Exception):
+    def __init__(self, reason: FailureReason, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+
+class HotPage:
+    """A page that is already navigated, past the popups, with its prompt box located."""
+    def __init__(self, browser: Browser, context: BrowserContext, page: Page, prompt_area: Locator, slot: int = 0):
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.prompt_area = prompt_area
+        # Bindings can only be exposed once per page, so the observer lives with the page
+        self.observer: Optional[DOMObserver] = None
+        # Blocked requests and asset cache savings while loading this page
+        self.network: Optional[InterceptionStats] = None
+        self.created_at = time.time()
+        # Last time it was parked ready for a prompt; a reused page ages from here
+        self.ready_at = self.created_at
+        # The page pool slot that prepared it
+        self.slot = slot
+        # Prompts answered in this tab; it is recycled after PAGE_MAX_PROMPTS
+        self.prompts = 0
+        # Set while the page holds a session's conversation
+        self.session_id: Optional[str] = None
+        # Playwright tracing was started on its context (by a sampled request)
+        self.tracing = False
+
+    def is_stale(self) -> bool:
+        if self.page.is_closed() or not self.browser.is_connected():
+            return True
+        if browser_pool.is_retiring(self.browser):
+            # Let the browser drain so it can be recycled
+            return True
+        return time.time() - self.ready_at > config.HOT_PAGE_MAX_AGE
+
+async def prepare_page(browser: Browser, request_id: str) -> HotPage:
+    """
+    Opens a fresh context on the browser, navigates to the chat page and
+    resolves the prompt box. Raises PagePreparationError on failure.
+    """
+    context = await browser.new_context(**CONTEXT_OPTIONS)
+    try:
+        network = await install_interception(context) if config.NETWORK_INTERCEPTION else None
+
+        # Apply stealth
+        page = await context.new_page()
+        await stealth_async(page)
+
+        prompt_area = await load_chat(page, request_id)
+        hot_page = HotPage(browser, context, page, prompt_area)
+        hot_page.network = network
+        if network:
+            logger.info("Page network savings", extra={"request_id": request_id, "props": network.as_dict()})
+        return hot_page
+    except BaseException:
+        await context.close()
+        raise
+
+def _record_stage(timings: Optional[Dict[str, int]], stage: str, started: float) -> float:
+    now = time.perf_counter()
+    metrics.stage_seconds.observe(now - started, stage)
+    latency_history.observe(stage, now - started)
+    if timings is not None:
+        timings[stage] = int((now - started) * 1000)
+    return now
+
+async def load_chat(page: Page, request_id: str, timings: Optional[Dict[str, int]] = None) -> Locator:
+    """
+    Navigates the page to the chat, handles popups and returns the prompt box.
+    Stage durations are added to `timings` when given. Raises PagePreparationError on failure.
+    """
+    # 1. Navigation
+    logger.info("Navigating to ChatGPT", extra={"request_id": request_id})
+    started = time.perf_counter()
+    try:
+        await page.goto(CHAT_URL, timeout=latency_history.get("TIMEOUT_PAGE_LOAD") * 1000)
+    except Exception as e:
+        logger.error("Navigation timeout or error: %s", e, extra={"request_id": request_id})
+        raise PagePreparationError(FailureReason.FAIL_TIMEOUT, "Navigation failed")
+    started = _record_stage(timings, "navigation", started)
+
+    # 1.5 Handle potential "Welcome" or "Log in" popups
+    logger.info("Waiting for input box", extra={"request_id": request_id})
+
+    prompt_area = None
+    poll = latency_history.get("POLL_INPUT_DISCOVERY")
+    deadline = time.time() + latency_history.get("TIMEOUT_INPUT_DISCOVERY")
+
+    # Wait a bit for page load
+    await asyncio.sleep(latency_history.get("SETTLE_AFTER_NAVIGATION"))
+
+    while time.time() < deadline: # retry loop
+        # One evaluate call checks popups and every prompt selector
+        try:
+            state = await probe_page(page)
+        except Exception as e:
+            logger.warning("Page probe failed: %s", e, extra={"request_id": request_id})
+            await asyncio.sleep(poll)
+            continue
+
+        # Check for "Stay logged out"
+        if state.stay_logged_out:
+            try:
+                logger.info("Clicking 'Stay logged out'", extra={"request_id": request_id})
+                await page.locator("div", has_text="Stay logged out").last.click()
+                await asyncio.sleep(poll)
+                state = await probe_page(page)
+            except Exception:
+                pass
+
+        # Check for "Login" landing page - if we see "Log in" and "Sign up" buttons, we might be stuck
+        if state.log_in:
+            logger.warning("Detected 'Log in' button. Might be on landing page.", extra={"request_id": request_id})
+            # Potentially could try to click "Start messaging" or similar if available without login,
+            # but usually "Stay logged out" covers it.
+
+        if state.prompt_selector:
+            prompt_area = page.locator(state.prompt_selector).first
+            break
+
+        await asyncio.sleep(poll)
+
+    if not prompt_area:
+        logger.error("Input box not found. Check if blocked or CAPTCHA.", extra={"request_id": request_id})
+        await take_screenshot(page, request_id, "no_input_box", FailureReason.FAIL_UI_CHANGE)
+        await dump_html(page, request_id, "no_input_box", FailureReason.FAIL_UI_CHANGE)
+
+        # Capture debug info
+        page_title = await page.title()
+        try:
+            body_text = await page.inner_text("body")
+            body_snippet = body_text[:500].replace("\n", " ")
+        except Exception:
+            body_snippet = "Could not get body text"
+
+        raise PagePreparationError(FailureReason.FAIL_UI_CHANGE, f"Input box not found. Title: {page_title}. Body: {body_snippet}")
+
+    _record_stage(timings, "input_discovery", started)
+    return prompt_area
+
+async def new_chat(page: Page, request_id: str, timings: Optional[Dict[str, int]] = None) -> Locator:
+    """
+    Starts a new conversation in an already loaded page and returns the prompt box,
+    skipping navigation and popups. Falls back to `load_chat` when the page has no
+    usable new-chat control.
+    """
+    started = time.perf_counter()
+    try:
+        state = await probe_page(page)
+        if state.new_chat_selector and not state.generating:
+            await page.locator(state.new_chat_selector).first.click()
+            deadline = time.time() + config.NEW_CHAT_TIMEOUT
+            while time.time() < deadline:
+                await asyncio.sleep(0.2)
+                state = await probe_page(page)
+                # The old thread is gone once no assistant message is left
+                if state.prompt_selector and not state.messages:
+                    _record_stage(timings, "new_chat", started)
+                    return page.locator(state.prompt_selector).first
+    except Exception as e:
+        logger.warning("New chat in place failed: %s", e, extra={"request_id": request_id})
+
+    logger.info("Reloading the chat for a new conversation", extra={"request_id": request_id})
+    return await load_chat(page, request_id, timings)
+
+class PagePool:
+    """
+    Keeps one prepared page per browser context slot so requests start at "fill prompt".
+    Each filler leases a slot, prepares a page in it and parks it in `ready`;
+    the slot only returns to the BrowserPool once the consumer releases the page,
+    which lets the filler prepare the next one in the background.
+    `held` counts every live page (ready, being prepared, checked out or parked
+    for a session); fillers wait while it is at `limit`, so when the worker
+    supervisor shrinks the limit under memory pressure, pages handed back are
+    not replaced until the total is below it.
+
+    Used pages are handed back through `recycle`: they start a new chat in place
+    and return to `ready`, or are parked in `sessions` for the next prompt of the
+    same session, until they have answered PAGE_MAX_PROMPTS prompts or failed.
+    """
+    def __init__(self, size: int = config.MAX_CONCURRENT_CONTEXTS):
+        self.size = size
+        self.limit = size
+        self.held = 0
+        self._capacity = asyncio.Condition()
+        self.ready: asyncio.Queue = asyncio.Queue()
+        self.last_failure: Optional[PagePreparationError] = None
+        # Idle pages holding a session's conversation, by session id
+        self.sessions: Dict[str, HotPage] = {}
+        # Serialises the prompts of one session
+        self.session_locks: Dict[str, asyncio.Lock] = {}
+        self.renewed = 0
+        self._tasks: List[asyncio.Task] = []
+        self._renewing: Set[asyncio.Task] = set()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._fill_loop(slot)) for slot in range(self.size)]
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for task in list(self._renewing):
+            task.cancel()
+        while not self.ready.empty():
+            await self.release(self.ready.get_nowait())
+        for session_id in list(self.sessions):
+            await self.release(self.sessions.pop(session_id))
+        await asyncio.to_thread(asset_cache.flush)
+
+    async def resize(self, limit: int):
+        """Sets how many pages may be held at once; lowering it only takes effect as pages are released."""
+        async with self._capacity:
+            self.limit = limit
+            self._capacity.notify_all()
+
+    async def _reserve(self):
+        async with self._capacity:
+            await self._capacity.wait_for(lambda: self.held < self.limit)
+            self.held += 1
+
+    async def _unreserve(self):
+        async with self._capacity:
+            self.held -= 1
+            self._capacity.notify()
+
+    async def _fill_loop(self, slot: int):
+        prewarm_id = f"prewarm-{slot}"
+        while True:
+            if circuit_breaker.state == OPEN:
+                # The upstream is failing; preparing pages would only add load and failure artifacts
+                await asyncio.sleep(circuit_breaker.retry_after())
+                continue
+            await self._reserve()
+            started = time.perf_counter()
+            try:
+                browser = await browser_pool.acquire()
+                _record_stage(None, "browser_acquire", started)
+            except asyncio.CancelledError:
+                await self._unreserve()
+                raise
+            except Exception as e:
+                await self._unreserve()
+                logger.error("Page pool could not acquire a browser: %s", e, extra={"request_id": prewarm_id})
+                await asyncio.sleep(config.HOT_PAGE_RETRY_DELAY)
+                continue
+
+            try:
+                hot_page = await prepare_page(browser, prewarm_id)
+                hot_page.slot = slot
+            except asyncio.CancelledError:
+                await browser_pool.release(browser)
+                await self._unreserve()
+                raise
+            except Exception as e:
+                await browser_pool.release(browser)
+                await self._unreserve()
+                if not isinstance(e, PagePreparationError):
+                    e = PagePreparationError(FailureReason.FAIL_UNKNOWN, str(e))
+                self.last_failure = e
+                logger.error("Page preparation failed: %s", e.message, extra={"request_id": prewarm_id})
+                await asyncio.sleep(config.HOT_PAGE_RETRY_DELAY)
+                continue
+
+            self.last_failure = None
+            self.ready.put_nowait(hot_page)
+            logger.info("Hot page ready", extra={"request_id": prewarm_id, "props": {"ready_pages": self.ready.qsize()}})
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(config.HOT_PAGE_SWEEP_INTERVAL)
+            for _ in range(self.ready.qsize()):
+                hot_page = self.ready.get_nowait()
+                if hot_page.is_stale():
+                    logger.info("Discarding stale hot page")
+                    await self.release(hot_page)
+                elif self.held > self.limit:
+                    logger.info("Discarding hot page to shed memory")
+                    await self.release(hot_page)
+                else:
+                    self.ready.put_nowait(hot_page)
+
+            for session_id, hot_page in list(self.sessions.items()):
+                idle = time.time() - hot_page.ready_at
+                if hot_page.is_stale() or idle > config.SESSION_IDLE_TIMEOUT or self.held > self.limit:
+                    logger.info("Closing idle session page", extra={"props": {"session_id": session_id, "idle_s": int(idle)}})
+                    del self.sessions[session_id]
+                    await self.release(hot_page)
+            for session_id, lock in list(self.session_locks.items()):
+                if not lock.locked() and session_id not in self.sessions:
+                    del self.session_locks[session_id]
+
+    async def acquire(self, request_id: str, session_id: Optional[str] = None) -> HotPage:
+        """
+        Takes a ready page, skipping stale ones. If none becomes ready in time the
+        most recent preparation failure is raised so the caller can report it.
+        With a session_id the session's parked page is taken when it is still usable,
+        and the session stays locked until the page is recycled.
+        """
+        if session_id is None:
+            return await self._take_ready(request_id)
+
+        lock = self.session_locks.setdefault(session_id, asyncio.Lock())
+        await lock.acquire()
+        try:
+            hot_page = self.sessions.pop(session_id, None)
+            if hot_page and (hot_page.is_stale() or not await self._prompt_visible(hot_page)):
+                logger.info("Session page is gone, starting a new conversation", extra={"request_id": request_id})
+                await self.release(hot_page)
+                hot_page = None
+            if hot_page is None:
+                hot_page = await self._take_ready(request_id)
+                hot_page.session_id = session_id
+            return hot_page
+        except BaseException:
+            lock.release()
+            raise
+
+    async def _take_ready(self, request_id: str) -> HotPage:
+        deadline = time.time() + config.HOT_PAGE_ACQUIRE_TIMEOUT
+        while True:
+            remaining = deadline - time.time()
+            try:
+                hot_page = await asyncio.wait_for(self.ready.get(), timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                failure = self.last_failure
+                if failure:
+                    raise PagePreparationError(failure.reason, failure.message)
+                raise PagePreparationError(FailureReason.FAIL_TIMEOUT, "No prepared page became available")
+
+            if hot_page.is_stale() or not await self._prompt_visible(hot_page):
+                logger.info("Discarding stale hot page", extra={"request_id": request_id})
+                await self.release(hot_page)
+                continue
+            return hot_page
+
+    async def _prompt_visible(self, hot_page: HotPage) -> bool:
+        # A late popup can cover the prompt box after the page was parked
+        try:
+            return await hot_page.prompt_area.is_visible()
+        except Exception:
+            return False
+
+    async def recycle(self, hot_page: HotPage, healthy: bool):
+        """
+        Hands a used page back. Pages that failed, are stale or reached
+        PAGE_MAX_PROMPTS are released; session pages are parked for the session's
+        next prompt; the rest start a new chat in the background and return to `ready`.
+        """
+        session_id = hot_page.session_id
+        try:
+            if not healthy or hot_page.prompts >= config.PAGE_MAX_PROMPTS or hot_page.is_stale():
+                await self.release(hot_page)
+            elif session_id:
+                hot_page.ready_at = time.time()
+                self.sessions[session_id] = hot_page
+            else:
+                task = asyncio.create_task(self._renew(hot_page))
+                self._renewing.add(task)
+                task.add_done_callback(self._renewing.discard)
+        finally:
+            lock = self.session_locks.get(session_id) if session_id else None
+            if lock and lock.locked():
+                lock.release()
+
+    async def _renew(self, hot_page: HotPage):
+        request_id = f"renew-{hot_page.slot}"
+        try:
+            hot_page.prompt_area = await new_chat(hot_page.page, request_id)
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                logger.warning("Could not start a new chat on a used page: %s", e, extra={"request_id": request_id})
+            await self.release(hot_page)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+        hot_page.ready_at = time.time()
+        self.renewed += 1
+        self.ready.put_nowait(hot_page)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready.qsize(),
+            "held": self.held,
+            "limit": self.limit,
+            "sessions": len(self.sessions),
+            "renewing": len(self._renewing),
+            "renewed": self.renewed,
+        }
+
+    async def release(self, hot_page: HotPage):
+        """Closes the used page's context and hands its slot back for refilling."""
+        try:
+            await hot_page.context.close()
+        except Exception as e:
+            logger.error("Error closing hot page context: %s", e)
+        finally:
+            try:
+                await browser_pool.release(hot_page.browser)
+            finally:
+                await self._unreserve()
+
+page_pool = PagePool(config.MAX_CONCURRENT_CONTEXTS)
@@ -0,0 +1,160 @@
+from collections import Counter
+from typing import List, Optional
+from playwright.async_api import Page
+from app.dom_observer import STOP_BUTTON_SELECTOR
+
+# Expanded selectors list
+PROMPT_SELECTORS = [
+    "#prompt-textarea",
+    "textarea[id='prompt-textarea']",
+    "textarea[data-id='root']",
+    "div[contenteditable='true']",
+    "textarea[placeholder='Message ChatGPT…']",
+    "textarea[placeholder='Message ChatGPT']"
+]
+
+SEND_SELECTORS = [
+    "button[data-testid='send-button']",
+    "button[aria-label='Send prompt']",
+    "button:has-text('Send')"
+]
+
+# Starts a new conversation without reloading the page
+NEW_CHAT_SELECTORS = [
+    "[data-testid='create-new-chat-button']",
+    "a[data-testid='new-chat-button']",
+    "nav a[href='/']"
+]
+
+# Checks every candidate selector and popup in one round trip. Selectors that are not
+# plain CSS (Playwright extensions such as :has-text) come back as null.
+PROBE_SCRIPT = """
+({prompt, send, stop, newChat}) => {
+    const visible = (el) => {
+        if (!el || getComputedStyle(el).visibility === 'hidden') return false;
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0;
+    };
+    const match = (selectors, pickLast, needEnabled) => selectors.map(selector => {
+        let elements;
+        try { elements = document.querySelectorAll(selector); } catch (e) { return null; }
+        const el = pickLast ? elements[elements.length - 1] : elements[0];
+        return visible(el) && !(needEnabled && el.disabled);
+    });
+    const withText = (tag, text, pickLast) => {
+        const found = document.evaluate(`//${tag}[contains(., "${text}")]`, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        if (!found.snapshotLength) return false;
+        return visible(found.snapshotItem(pickLast ? found.snapshotLength - 1 : 0));
+    };
+    return {
+        prompt: match(prompt, false, false),
+        send: match(send, true, true),
+        stay_logged_out: withText('div', 'Stay logged out', true),
+        log_in: withText('button', 'Log in', false),
+        sign_up_modal: withText('div', 'Sign up to chat', true),
+        generating: [...document.querySelectorAll(stop)].some(visible),
+        new_chat: newChat.find(selector => visible(document.querySelector(selector))) || null,
+        messages: document.querySelectorAll('.markdown').length,
+        title: document.title,
+    };
+}
+"""
+
+# Resolves in the page as soon as any plain-CSS send selector is visible and enabled
+SEND_READY_SCRIPT = """
+(selectors) => selectors.some(selector => {
+    let elements;
+    try { elements = document.querySelectorAll(selector); } catch (e) { return false; }
+    const el = elements[elements.length - 1];
+    return !!el && !el.disabled && el.getBoundingClientRect().width > 0;
+})
+"""
+
+class SelectorRanker:
+    """
+    Per-process success ranking of interchangeable selectors. The selector that
+    matched last comes first, the rest are ordered by how often they matched
+    when the element was found at all, so selectors that rarely match sink.
+    """
+    def __init__(self, selectors: List[str]):
+        self.selectors = list(selectors)
+        self.hits: Counter = Counter()
+        self.tries: Counter = Counter()
+        self.last: Optional[str] = None
+
+    def order(self) -> List[str]:
+        def score(selector: str) -> tuple:
+            rate = (self.hits[selector] + 1) / (self.tries[selector] + 2)
+            return (selector != self.last, -rate, self.selectors.index(selector))
+        return sorted(self.selectors, key=score)
+
+    def record(self, matches: dict):
+        """Records one probe in which the element was found; `matches` maps selector to bool."""
+        for selector, matched in matches.items():
+            self.tries[selector] += 1
+            if matched:
+                self.hits[selector] += 1
+
+    def choose(self, matches: dict) -> Optional[str]:
+        """Picks the best-ranked matching selector and records the outcome."""
+        for selector in self.order():
+            if matches.get(selector):
+                self.record(matches)
+                self.last = selector
+                return selector
+        return None
+
+    def stats(self) -> dict:
+        return {selector: f"{self.hits[selector]}/{self.tries[selector]}" for selector in self.order()}
+
+prompt_ranker = SelectorRanker(PROMPT_SELECTORS)
+send_ranker = SelectorRanker(SEND_SELECTORS)
+
+class PageState:
+    """Snapshot of the chat page taken by `probe_page`."""
+    def __init__(self, snapshot: dict, prompt_selector: Optional[str], send_selector: Optional[str]):
+        self.prompt_selector = prompt_selector
+        self.send_selector = send_selector
+        self.stay_logged_out: bool = snapshot["stay_logged_out"]
+        self.log_in: bool = snapshot["log_in"]
+        self.sign_up_modal: bool = snapshot["sign_up_modal"]
+        self.generating: bool = snapshot["generating"]
+        self.new_chat_selector: Optional[str] = snapshot["new_chat"]
+        # Assistant messages currently on the page
+        self.messages: int = snapshot["messages"]
+        self.title: str = snapshot["title"]
+
+async def _locator_matches(page: Page, selectors: List[str], pick_last: bool, need_enabled: bool) -> dict:
+    # Fallback for the few selectors the page cannot evaluate itself
+    matches = {}
+    for selector in selectors:
+        try:
+            locator = page.locator(selector)
+            locator = locator.last if pick_last else locator.first
+            matches[selector] = await locator.is_visible() and (not need_enabled or await locator.is_enabled())
+        except Exception:
+            matches[selector] = False
+    return matches
+
+async def probe_page(page: Page) -> PageState:
+    """Reads prompt box, send button, popups and generation state in a single evaluate call."""
+    prompt_order = prompt_ranker.order()
+    send_order = send_ranker.order()
+    snapshot = await page.evaluate(PROBE_SCRIPT, {"prompt": prompt_order, "send": send_order, "stop": STOP_BUTTON_SELECTOR, "newChat": NEW_CHAT_SELECTORS})
+
+    prompt_matches = dict(zip(prompt_order, snapshot["prompt"]))
+    send_matches = dict(zip(send_order, snapshot["send"]))
+    for matches, pick_last, need_enabled in ((prompt_matches, False, False), (send_matches, True, True)):
+        unsupported = [selector for selector, matched in matches.items() if matched is None]
+        if unsupported and not any(matches.values()):
+            matches.update(await _locator_matches(page, unsupported, pick_last, need_enabled))
+
+    return PageState(snapshot, prompt_ranker.choose(prompt_matches), send_ranker.choose(send_matches))
+
+async def wait_send_enabled(page: Page, timeout: float) -> bool:
+    """Waits until the send button accepts a click; False on timeout."""
+    try:
+        await page.wait_for_function(SEND_READY_SCRIPT, arg=send_ranker.order(), timeout=timeout * 1000, polling="raf")
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,256 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional
+from app.config import config
+from app.logger import logger
+
+# Playwright classes whose coroutine methods are timed when PROFILE_PLAYWRIGHT is set
+PROFILED_CLASSES = ("Page", "Frame", "Locator", "ElementHandle", "JSHandle", "Keyboard", "Mouse", "BrowserContext", "Route", "Tracing")
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_current_request: contextvars.ContextVar = contextvars.ContextVar("profiled_request", default=None)
+
+class CallStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 1),
+            "avg_ms": round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+def _top(stats: Dict[str, CallStats], limit: int) -> Dict[str, dict]:
+    ranked = sorted(stats.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+    return {key: value.as_dict() for key, value in ranked}
+
+class RequestProfile:
+    """Playwright calls made on behalf of one request."""
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.calls: Dict[str, CallStats] = defaultdict(CallStats)
+
+    def as_dict(self, limit: int = 10) -> dict:
+        return {
+            "request_id": self.request_id,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+            "playwright_calls": sum(stats.count for stats in self.calls.values()),
+            "playwright_ms": round(sum(stats.total for stats in self.calls.values()) * 1000, 1),
+            "by_method": _top(self.calls, limit),
+        }
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a sleeping task; the excess is time the loop was blocked."""
+    def __init__(self, interval: float = config.PROFILE_LAG_INTERVAL):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=config.PROFILE_LAG_SAMPLES)
+        self.blocked = 0
+        self.max = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            self.samples.append(lag)
+            if lag > self.max:
+                self.max = lag
+            if lag * 1000 > config.PROFILE_LAG_BLOCKED_MS:
+                self.blocked += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[int(q * (len(ordered) - 1))]
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "samples": len(self.samples),
+            "p50_ms": round(self.percentile(0.5) * 1000, 2),
+            "p99_ms": round(self.percentile(0.99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 1),
+            "blocked": self.blocked,
+        }
+
+    def reset(self):
+        self.samples.clear()
+        self.blocked = 0
+        self.max = 0.0
+
+def _call_site(frame) -> str:
+    # First frame outside Playwright and this module, relative to the repository root
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename != __file__ and "playwright" not in filename:
+            return f"{os.path.relpath(filename, _APP_ROOT)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "unknown"
+
+class Profiler:
+    """
+    Profiling surface behind /debug/profile: event-loop lag, every Playwright
+    call counted and timed per method, per call site and per request, and
+    Playwright traces for a sampled share of requests.
+    """
+    def __init__(self):
+        self.lag = LoopLagMonitor()
+        self.by_method: Dict[str, CallStats] = defaultdict(CallStats)
+        self.by_site: Dict[str, CallStats] = defaultdict(CallStats)
+        self.recent: deque = deque(maxlen=config.PROFILE_RECENT_REQUESTS)
+        self.installed = False
+        self.traces = 0
+        self.since = time.time()
+
+    def start(self):
+        if config.PROFILE_LOOP_LAG:
+            self.lag.start()
+        if config.PROFILE_PLAYWRIGHT:
+            self.install()
+
+    def stop(self):
+        self.lag.stop()
+
+    def install(self):
+        """Wraps the coroutine methods of the Playwright API classes with a timer."""
+        if self.installed:
+            return
+        import playwright.async_api as api
+        for class_name in PROFILED_CLASSES:
+            cls = getattr(api, class_name, None)
+            if cls is None:
+                continue
+            for name, method in list(vars(cls).items()):
+                if not name.startswith("_") and inspect.iscoroutinefunction(method):
+                    setattr(cls, name, self._timed(f"{class_name}.{name}", method))
+        self.installed = True
+        logger.info("Playwright call profiling installed")
+
+    def _timed(self, key: str, method):
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            site = _call_site(sys._getframe(1))
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.by_method[key].add(elapsed)
+                self.by_site[f"{key} @ {site}"].add(elapsed)
+                request = _current_request.get()
+                if request is not None:
+                    request.calls[key].add(elapsed)
+        return timed
+
+    def begin_request(self, request_id: str) -> Optional[contextvars.Token]:
+        """Attributes Playwright calls made from the current task to this request."""
+        if not self.installed:
+            return None
+        return _current_request.set(RequestProfile(request_id))
+
+    def end_request(self, token: Optional[contextvars.Token]):
+        if token is None:
+            return
+        request = _current_request.get()
+        _current_request.reset(token)
+        if request is not None:
+            request.elapsed = time.perf_counter() - request.started
+            self.recent.append(request)
+            logger.info("Request profile", extra={"request_id": request.request_id, "props": request.as_dict(limit=5)})
+
+    async def start_trace(self, hot_page, request_id: str) -> bool:
+        """Starts a Playwright trace chunk on the page's context for a sampled share of requests."""
+        if random.random() >= config.PROFILE_TRACE_SAMPLE_RATE:
+            return False
+        try:
+            if hot_page.tracing:
+                await hot_page.context.tracing.start_chunk()
+            else:
+                await hot_page.context.tracing.start(screenshots=True, snapshots=True)
+                hot_page.tracing = True
+            return True
+        except Exception as e:
+            logger.warning("Could not start trace: %s", e, extra={"request_id": request_id})
+            return False
+
+    async def stop_trace(self, hot_page, request_id: str):
+        path = os.path.join(config.PROFILE_TRACE_DIR, f"{request_id}.zip")
+        try:
+            os.makedirs(config.PROFILE_TRACE_DIR, exist_ok=True)
+            await hot_page.context.tracing.stop_chunk(path=path)
+            self.traces += 1
+            logger.info("Saved Playwright trace to %s", path, extra={"request_id": request_id})
+        except Exception as e:
+            logger.warning("Could not save trace: %s", e, extra={"request_id": request_id})
+
+    def snapshot(self, top: int = 20) -> dict:
+        return {
+            "pid": os.getpid(),
+            "since": self.since,
+            "event_loop_lag": self.lag.stats(),
+            "playwright": {
+                "installed": self.installed,
+                "calls": sum(stats.count for stats in self.by_method.values()),
+                "by_method": _top(self.by_method, top),
+                "by_call_site": _top(self.by_site, top),
+            },
+            "recent_requests": [request.as_dict() for request in list(self.recent)[-top:]],
+            "traces_saved": self.traces,
+        }
+
+    def reset(self):
+        self.lag.reset()
+        self.by_method.clear()
+        self.by_site.clear()
+        self.recent.clear()
+        self.since = time.time()
+
+    def dump(self, name: str = "profile") -> str:
+        """Writes the full snapshot as JSON and returns the file path."""
+        return write_dump(self.snapshot(top=1000), name)
+
+def write_dump(snapshot: dict, name: str = "profile") -> str:
+    """Writes a snapshot taken on the event loop; safe to run in a worker thread."""
+    os.makedirs(config.PROFILE_DUMP_DIR, exist_ok=True)
+    path = os.path.join(config.PROFILE_DUMP_DIR, f"{name}-{int(time.time())}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+profiler = Profiler()
@@ -0,0 +1,88 @@
+from typing import Awaitable, Callable, Dict
+from playwright.async_api import Page, Locator
+from app.config import config
+from app.logger import logger
+
+# Synthetic paste for editors that only accept clipboard input. When no handler
+# takes the paste, the text is inserted as one editing operation instead.
+PASTE_SCRIPT = """
+([el, text]) => {
+    el.focus();
+    const data = new DataTransfer();
+    data.setData('text/plain', text);
+    const event = new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true});
+    el.dispatchEvent(event);
+    if (!event.defaultPrevented) {
+        document.execCommand('insertText', false, text);
+    }
+}
+"""
+
+# Empties the box after an attempt that left partial text behind
+CLEAR_SCRIPT = """
+el => {
+    el.focus();
+    if (el.value !== undefined) {
+        el.value = '';
+    } else {
+        document.getSelection().selectAllChildren(el);
+        document.execCommand('delete');
+    }
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+}
+"""
+
+ENTERED_LENGTH_SCRIPT = "el => (el.value !== undefined ? el.value : el.innerText).trim().length"
+
+async def _fill(page: Page, prompt_area: Locator, prompt: str):
+    await prompt_area.fill(prompt, timeout=config.PROMPT_FILL_TIMEOUT * 1000)
+
+async def _insert_text(page: Page, prompt_area: Locator, prompt: str):
+    # A single Input.insertText call, however long the prompt
+    await prompt_area.click(timeout=config.PROMPT_FILL_TIMEOUT * 1000)
+    await page.keyboard.insert_text(prompt)
+
+async def _paste(page: Page, prompt_area: Locator, prompt: str):
+    await prompt_area.evaluate(PASTE_SCRIPT, prompt)
+
+async def _type(page: Page, prompt_area: Locator, prompt: str):
+    # One key event per character; only acceptable for short prompts
+    await prompt_area.click(timeout=config.PROMPT_FILL_TIMEOUT * 1000)
+    await page.keyboard.type(prompt)
+
+# In the order they are tried
+INPUT_METHODS: Dict[str, Callable[[Page, Locator, str], Awaitable[None]]] = {
+    "fill": _fill,
+    "insert_text": _insert_text,
+    "paste": _paste,
+    "type": _type,
+}
+
+async def entered_length(prompt_area: Locator) -> int:
+    return await prompt_area.evaluate(ENTERED_LENGTH_SCRIPT)
+
+def _landed(entered: int, prompt: str) -> bool:
+    # Rich editors normalise whitespace and line breaks, so lengths only roughly match
+    return entered >= len(prompt.strip()) * 0.95
+
+async def enter_prompt(page: Page, prompt_area: Locator, prompt: str, request_id: str) -> str:
+    """
+    Puts the whole prompt into the prompt box in one operation and returns the
+    method that worked. Typing key by key is only tried for prompts up to
+    PROMPT_TYPE_MAX_CHARS. Raises RuntimeError when no method got the text in.
+    """
+    for method, enter in INPUT_METHODS.items():
+        if method == "type" and len(prompt) > config.PROMPT_TYPE_MAX_CHARS:
+            continue
+        try:
+            await enter(page, prompt_area, prompt)
+            if method == "fill" or _landed(await entered_length(prompt_area), prompt):
+                return method
+            logger.warning("Prompt input via %s did not land", method, extra={"request_id": request_id})
+        except Exception as e:
+            logger.info("Prompt input via %s failed: %s", method, e, extra={"request_id": request_id})
+        try:
+            await prompt_area.evaluate(CLEAR_SCRIPT)
+        except Exception:
+            pass
+    raise RuntimeError(f"Could not enter a prompt of {len(prompt)} characters")
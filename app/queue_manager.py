@@ -1,74 +1,620 @@
 import asyncio
-from app.models import GenerateRequest, GenerateResponse, TaskStatus, FailureReason
+import itertools
+import math
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+from app.models import GenerateRequest, GenerateResponse, TaskStatus, FailureReason, CacheMode, BatchStatusResponse
 from app.logger import logger
 from app.config import config
 from app.browser_service import BrowserService
+from app.page_pool import page_pool, HotPage
+from app.response_cache import response_cache, prompt_key
+from app.memory import host_memory_available_fraction
+from app.dispatcher import dispatcher, RemoteService
+from app.metrics import metrics
+from app.hedging import hedge_policy
+from app.circuit_breaker import circuit_breaker
+
+class Job:
+    """
+    A queued generation request. Callers wait on `future`; streaming callers
+    additionally subscribe to a channel of (event, data) tuples. Identical
+    prompts share one job, so it is only cancelled once every waiter released it.
+    """
+    def __init__(self, request: GenerateRequest, request_id: str, cache_key: Optional[str] = None):
+        self.request = request
+        self.request_id = request_id
+        self.cache_key = cache_key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.subscribers: List[asyncio.Queue] = []
+        self.task: Optional[asyncio.Task] = None
+        self.service: Optional[BrowserService] = None
+        self.result: Optional[GenerateResponse] = None
+        self.waiters = 1
+        self.priority = request.priority
+        self.deadline = time.time() + request.deadline_s if request.deadline_s else None
+        # Jobs to run afterwards on the same page (batches with reuse_page)
+        self.followups: List["Job"] = []
+        self.enqueued_at = time.time()
+        # Holds one of the circuit breaker's half-open probe slots until it runs
+        self.probe_reserved = False
+
+    def subscribe(self) -> asyncio.Queue:
+        channel = asyncio.Queue()
+        if self.result:
+            channel.put_nowait(("done", self.result.model_dump(mode="json")))
+        elif self.service and self.service.buffer.length:
+            # Joined an in-flight job: catch up with the text streamed so far
+            channel.put_nowait(("reset", {"text": self.service.accumulated_text}))
+        self.subscribers.append(channel)
+        return channel
+
+    def unsubscribe(self, channel: asyncio.Queue):
+        """Stops publishing to a channel whose client has gone away."""
+        if channel in self.subscribers:
+            self.subscribers.remove(channel)
+
+    def publish(self, event: str, data: dict):
+        for channel in self.subscribers:
+            channel.put_nowait((event, data))
+
+    def on_text(self, text: str, reset: bool):
+        """Forwards streamed text from the BrowserService to subscribers."""
+        if self.subscribers:
+            self.publish("reset" if reset else "chunk", {"text": text})
+
+    def finish(self, result: GenerateResponse):
+        self.result = result
+        if not self.future.done():
+            self.future.set_result(result)
+        self.publish("done", result.model_dump(mode="json"))
+
+    def release(self):
+        """Called by a waiter that no longer wants the result."""
+        self.waiters -= 1
+        if self.waiters <= 0:
+            self.cancel()
+
+    def cancel(self):
+        """Drops the job if it is still queued, or stops its browser work if running."""
+        if not self.future.done():
+            self.future.cancel()
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be served in time; maps to an HTTP 429/503 with Retry-After."""
+    def __init__(self, status_code: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.message = message
+
+class Batch:
+    """Shared tracking for the jobs of one /generate/batch call."""
+    def __init__(self, batch_id: str, jobs: List[Job]):
+        self.batch_id = batch_id
+        self.jobs = jobs
+        self.created_at = time.time()
+
+    def status(self) -> BatchStatusResponse:
+        results = [job.result for job in self.jobs if job.result]
+        succeeded = sum(1 for result in results if result.status == TaskStatus.COMPLETED)
+        return BatchStatusResponse(
+            batch_id=self.batch_id,
+            total=len(self.jobs),
+            pending=len(self.jobs) - len(results),
+            succeeded=succeeded,
+            failed=len(results) - succeeded
+        )
 
 class QueueManager:
-    def __init__(self, max_concurrent: int = config.MAX_CONCURRENT_BROWSERS):
-        self.queue = asyncio.Queue()
+    """
+    Priority queue of jobs served by a supervised set of workers. MIN_WORKERS stay
+    alive; more are added while the queue is deeper than the idle workers or its
+    wait time keeps rising, up to `max_allowed`, and extra workers exit once idle.
+    Under memory pressure `max_allowed` (and with it the hot page pool) shrinks.
+    """
+    def __init__(self, max_concurrent: int = config.TOTAL_CONCURRENT_CONTEXTS):
+        # Entries are (-priority, sequence, job): higher priority first, FIFO within a priority
+        self.queue = asyncio.PriorityQueue()
         self.max_concurrent = max_concurrent
-        self.active_workers = 0
-        self.lock = asyncio.Lock()
+        self.min_workers = min(config.MIN_WORKERS, max_concurrent)
+        # Lowered below max_concurrent while the host is short of memory
+        self.max_allowed = max_concurrent
+        self.workers: Set[asyncio.Task] = set()
+        self.idle_workers = 0
+        # Moving average of how long jobs sit in the queue, and its value at the last supervisor tick
+        self.queue_wait = 0.0
+        self._last_queue_wait = 0.0
+        self._supervisor_task: Optional[asyncio.Task] = None
+        self._sequence = itertools.count()
+        self.queued_priorities: Counter = Counter()
+        self.running = 0
+        # Moving average of how long a job holds a browser slot
+        self.service_time = config.ADMISSION_INITIAL_SERVICE_TIME
+        # In-flight jobs by prompt key, for single-flight deduplication
+        self.inflight: Dict[str, Job] = {}
+        self.coalesced = 0
+        self.batches: Dict[str, Batch] = {}
+
+    @property
+    def active_workers(self) -> int:
+        return len(self.workers)
+
+    async def start(self):
+        for _ in range(self.min_workers):
+            self._spawn_worker()
+        self._supervisor_task = asyncio.create_task(self._supervisor_loop())
+
+    async def stop(self):
+        if self._supervisor_task:
+            self._supervisor_task.cancel()
+        for worker in list(self.workers):
+            worker.cancel()
+
+    def _spawn_worker(self):
+        worker = asyncio.create_task(self._worker_loop())
+        self.workers.add(worker)
+        worker.add_done_callback(self.workers.discard)
+        logger.info("Started new worker", extra={"worker_count": self.active_workers})
+
+    async def _admit(self, request: GenerateRequest, request_id: str) -> Tuple[Job, bool]:
+        """
+        Resolves a request to a job: a finished one from the cache, an in-flight
+        one for the same prompt, or a new one. Returns (job, is_new).
+        """
+        if request.session_id:
+            # The answer depends on the conversation so far, so it is neither cached nor shared
+            return Job(request, request_id), True
+
+        key = prompt_key(request.prompt)
+
+        if request.cache != CacheMode.BYPASS:
+            cached = await response_cache.get(key)
+            if cached:
+                logger.info("Cache hit for request %s", request_id, extra={"request_id": request_id})
+                job = Job(request, request_id, key)
+                job.finish(cached.model_copy(update={"request_id": request_id, "cached": True, "latency_ms": 0}))
+                return job, False
+
+            if request.cache == CacheMode.ONLY:
+                job = Job(request, request_id, key)
+                job.finish(GenerateResponse(
+                    request_id=request_id,
+                    status=TaskStatus.FAILED,
+                    failure_reason=FailureReason.FAIL_CACHE_MISS,
+                    error_message="Prompt not in cache and cache mode is 'only'",
+                    latency_ms=0
+                ))
+                return job, False
+
+            inflight = self.inflight.get(key)
+            if inflight and not inflight.future.done():
+                logger.info("Request %s joined in-flight request %s", request_id, inflight.request_id, extra={"request_id": request_id})
+                inflight.waiters += 1
+                self.coalesced += 1
+                metrics.coalesced.inc()
+                return inflight, False
+
+        job = Job(request, request_id, key)
+        self.inflight[key] = job
+        job.future.add_done_callback(lambda _: self._forget_inflight(job))
+        return job, True
+
+    def estimate_wait(self, priority: int = 0, extra: int = 0) -> float:
+        """Seconds until a new job with this priority would get a browser slot."""
+        ahead = sum(count for queued_priority, count in self.queued_priorities.items() if queued_priority >= priority)
+        occupied = self.running + ahead + extra
+        if occupied < self.max_allowed:
+            return 0.0
+        rounds = (occupied - self.max_allowed) // self.max_allowed + 1
+        return rounds * self.service_time
+
+    def check_admission(self, request: GenerateRequest, count: int = 1):
+        """Fast-rejects work that would overflow the queue or miss its deadline, or while the circuit is open."""
+        if not circuit_breaker.admits(count):
+            raise AdmissionRejected(503, circuit_breaker.retry_after(), circuit_breaker.describe())
+
+        queued = sum(self.queued_priorities.values())
+        if queued + count > config.MAX_QUEUE_SIZE:
+            retry_after = math.ceil(self.service_time * count / self.max_allowed)
+            raise AdmissionRejected(503, max(retry_after, 1), "Queue is full")
+
+        if request.deadline_s:
+            wait = self.estimate_wait(request.priority, count - 1)
+            if wait > request.deadline_s:
+                retry_after = math.ceil(wait - request.deadline_s)
+                raise AdmissionRejected(429, max(retry_after, 1), f"Estimated wait of {wait:.0f}s exceeds the {request.deadline_s:.0f}s deadline")
+
+    async def _enqueue_job(self, job: Job):
+        logger.info("Enqueuing request %s", job.request_id, extra={"request_id": job.request_id})
+        self.queued_priorities[job.priority] += 1
+        if circuit_breaker.reserve():
+            job.probe_reserved = True
+            job.future.add_done_callback(lambda _: self._drop_probe_reservation(job))
+        self.queue.put_nowait((-job.priority, next(self._sequence), job))
+
+        # Start a worker right away if no idle one can take the job
+        if self.queue.qsize() > self.idle_workers and self.active_workers < self.max_allowed:
+            self._spawn_worker()
+
+    def _drop_probe_reservation(self, job: Job):
+        if job.probe_reserved:
+            job.probe_reserved = False
+            circuit_breaker.unreserve()
+
+    async def submit(self, request: GenerateRequest, request_id: str, admit: bool = True) -> Job:
+        """
+        Returns the job answering this request. New jobs pass admission control
+        first unless `admit` is False (e.g. already-accepted jobs being replayed).
+        """
+        job, is_new = await self._admit(request, request_id)
+        if is_new:
+            if admit:
+                try:
+                    self.check_admission(request)
+                except AdmissionRejected as e:
+                    logger.warning("Rejected request %s: %s", request_id, e.message, extra={"request_id": request_id})
+                    job.cancel()
+                    raise
+            await self._enqueue_job(job)
+        return job
+
+    async def submit_batch(self, requests: List[GenerateRequest], batch_id: str, reuse_page: bool = False) -> Batch:
+        """
+        Admits all prompts of a batch as one unit. With reuse_page, new jobs are
+        grouped so one worker answers BATCH_PROMPTS_PER_PAGE prompts in a row on one page.
+        """
+        jobs = []
+        new_jobs = []
+        for index, request in enumerate(requests):
+            job, is_new = await self._admit(request, f"{batch_id}-{index}")
+            jobs.append(job)
+            if is_new:
+                new_jobs.append(job)
+
+        group_size = config.BATCH_PROMPTS_PER_PAGE if reuse_page else 1
+        if new_jobs:
+            try:
+                self.check_admission(new_jobs[0].request, math.ceil(len(new_jobs) / group_size))
+            except AdmissionRejected as e:
+                logger.warning("Rejected batch %s: %s", batch_id, e.message, extra={"props": {"batch_id": batch_id}})
+                for job in new_jobs:
+                    job.cancel()
+                # Give back the waiter counts taken on other requests' in-flight jobs
+                for job in jobs:
+                    if job not in new_jobs and not job.future.done():
+                        job.release()
+                raise
+
+        for start in range(0, len(new_jobs), group_size):
+            leader, *followups = new_jobs[start:start + group_size]
+            leader.followups = followups
+            await self._enqueue_job(leader)
+
+        batch = Batch(batch_id, jobs)
+        self.batches[batch_id] = batch
+        # Keep the batch visible for status queries until all of its jobs have settled
+        asyncio.gather(*(job.future for job in jobs), return_exceptions=True).add_done_callback(
+            lambda _: self.batches.pop(batch_id, None)
+        )
+        logger.info("Enqueued batch %s", batch_id, extra={"props": {"batch_id": batch_id, "prompts": len(jobs), "new_jobs": len(new_jobs)}})
+        return batch
 
     async def enqueue(self, request: GenerateRequest, request_id: str) -> GenerateResponse:
-        logger.info(f"Enqueuing request {request_id}", extra={"request_id": request_id})
-        
-        # Create a future to wait for the result
-        loop = asyncio.get_running_loop()
-        future = loop.create_future()
-        
-        await self.queue.put((request, request_id, future))
-        
-        # Attempt to start a worker if we are under capacity
-        async with self.lock:
-            if self.active_workers < self.max_concurrent:
-                asyncio.create_task(self._worker_loop())
-                self.active_workers += 1
-                logger.info("Started new worker", extra={"worker_count": self.active_workers})
-
-        # Wait for the result
-        return await future
+        job = await self.submit(request, request_id)
+        return await self.wait(job, request_id, request.include_timings)
+
+    async def wait(self, job: Job, request_id: str, include_timings: bool = False) -> GenerateResponse:
+        """Waits for a job's result on behalf of one caller, releasing the job if that caller is cancelled."""
+        # Shielded because the job may be shared with other callers
+        try:
+            result = await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            if not job.future.cancelled():
+                # Our caller went away, not the job
+                job.release()
+                raise
+            return GenerateResponse(
+                request_id=request_id,
+                status=TaskStatus.FAILED,
+                failure_reason=FailureReason.FAIL_UNKNOWN,
+                error_message="Job was cancelled",
+                latency_ms=0
+            )
+        if result.request_id != request_id or (result.timings and not include_timings):
+            result = result.model_copy(update={"request_id": request_id, "timings": result.timings if include_timings else None})
+        return result
+
+    def _record(self, result: GenerateResponse):
+        metrics.requests.inc(result.status.value, result.failure_reason.value if result.failure_reason else "")
+        if result.timings:
+            metrics.request_seconds.observe(result.timings["total"] / 1000, result.status.value)
+            if dispatcher.enabled:
+                # Browser stages were measured in a host process; fold them into this process' histograms
+                for stage, ms in result.timings.items():
+                    if stage not in ("queue_wait", "total"):
+                        metrics.stage_seconds.observe(ms / 1000, stage)
+
+    def _forget_inflight(self, job: Job):
+        if self.inflight.get(job.cache_key) is job:
+            del self.inflight[job.cache_key]
+
+    async def _process(self, job: Job):
+        """Runs a job and any follow-up jobs, handing the page from one prompt to the next."""
+        hot_page = None
+        chain = [job] + job.followups
+        for position, current in enumerate(chain):
+            if current.future.done():
+                # Cancelled while waiting for its turn
+                continue
+            if current.deadline and time.time() > current.deadline:
+                # Nobody is waiting for this answer any more; do not spend a browser on it
+                logger.info("Dropping request %s past its deadline", current.request_id, extra={"request_id": current.request_id})
+                result = GenerateResponse(
+                    request_id=current.request_id,
+                    status=TaskStatus.FAILED,
+                    failure_reason=FailureReason.FAIL_TIMEOUT,
+                    error_message="Deadline passed while queued",
+                    latency_ms=int((time.time() - current.enqueued_at) * 1000)
+                )
+                self._record(result)
+                current.finish(result)
+                continue
+            allowed, probe = circuit_breaker.acquire(current.probe_reserved)
+            current.probe_reserved = False
+            if not allowed:
+                # Queued before the circuit opened; fail it now instead of spending a browser on it
+                result = GenerateResponse(
+                    request_id=current.request_id,
+                    status=TaskStatus.FAILED,
+                    failure_reason=FailureReason.FAIL_CIRCUIT_OPEN,
+                    error_message=circuit_breaker.describe(),
+                    latency_ms=int((time.time() - current.enqueued_at) * 1000)
+                )
+                self._record(result)
+                current.finish(result)
+                continue
+            if probe:
+                logger.info("Circuit half-open, probing with request %s", current.request_id, extra={"request_id": current.request_id})
+            keep_page = position < len(chain) - 1
+            started = time.time()
+            self.running += 1
+            try:
+                hot_page = await self._run(current, hot_page, keep_page)
+            finally:
+                self.running -= 1
+                state = circuit_breaker.state
+                circuit_breaker.record(current.result.failure_reason if current.result else None, probe)
+                if circuit_breaker.state != state:
+                    logger.warning("Circuit breaker %s", circuit_breaker.state, extra={"props": circuit_breaker.stats()})
+            if current.result:
+                alpha = config.ADMISSION_SERVICE_TIME_ALPHA
+                self.service_time = (1 - alpha) * self.service_time + alpha * (time.time() - started)
+
+        if hot_page:
+            # The trailing jobs were cancelled; give the kept page back
+            await page_pool.recycle(hot_page, healthy=True)
+
+    async def _run(self, job: Job, hot_page: Optional[HotPage] = None, keep_page: bool = False) -> Optional[HotPage]:
+        request_id = job.request_id
+        logger.info("Processing request %s", request_id, extra={"request_id": request_id})
+        queue_wait = time.time() - job.enqueued_at
+        metrics.stage_seconds.observe(queue_wait, "queue_wait")
+
+        # Pages handed along a batch and session tabs cannot be raced on a second page
+        hedged = hedge_policy.enabled and hot_page is None and not keep_page and not job.request.session_id
+        service = None if hedged else self._new_service(request_id, job.on_text, hot_page)
+        job.service = service
+        try:
+            if hedged:
+                job.task = asyncio.create_task(self._run_hedged(job))
+            else:
+                job.task = asyncio.create_task(service.process_request(job.request, keep_page=keep_page))
+            # asyncio.wait does not propagate the job's own cancellation into this loop
+            await asyncio.wait({job.task})
+            if job.task.cancelled():
+                logger.info("Request %s cancelled while processing", request_id, extra={"request_id": request_id})
+            else:
+                result = job.task.result()
+                if result.failure_reason == FailureReason.SUCCESS_FULL and job.cache_key:
+                    await response_cache.put(job.cache_key, result.model_copy(update={"timings": None}))
+                timings = {"queue_wait": int(queue_wait * 1000), **(result.timings or {})}
+                timings["total"] = timings["queue_wait"] + (result.latency_ms or 0)
+                result = result.model_copy(update={"timings": timings})
+                self._record(result)
+                job.finish(result)
+        except Exception as e:
+            logger.error("Worker unhandled exception processing %s: %s", request_id, e)
+            # Ensure future is set even on crash
+            result = GenerateResponse(
+                request_id=request_id,
+                status=TaskStatus.FAILED,
+                failure_reason=FailureReason.FAIL_UNKNOWN,
+                output_text=str(e),
+                latency_ms=0
+            )
+            self._record(result)
+            job.finish(result)
+
+        # Only set when the service kept the page for the next prompt
+        return service.hot_page if keep_page else None
+
+    def _new_service(self, request_id: str, on_text, hot_page: Optional[HotPage] = None):
+        if dispatcher.enabled:
+            # Runs in a browser-host process
+            return RemoteService(request_id, on_text=on_text)
+        return BrowserService(request_id, on_text=on_text, hot_page=hot_page)
+
+    def _spare_capacity(self) -> bool:
+        if not self.queue.empty() or self.running >= self.max_allowed:
+            return False
+        # In-process, a hedge must not wait for a page that a queued job could use
+        return dispatcher.enabled or not page_pool.ready.empty()
+
+    async def _run_hedged(self, job: Job) -> GenerateResponse:
+        """
+        Runs the job and, if it has streamed nothing after `hedge_policy.delay()`
+        while there is spare capacity and budget, a second attempt for the same
+        prompt. The first attempt to stream text (or to succeed) wins and the
+        other is cancelled, which closes its page.
+        """
+        hedge_policy.earn()
+        run_started = time.time()
+        # task -> service of each attempt
+        attempts = {}
+        winner = None
+
+        def choose(service):
+            nonlocal winner
+            winner = service
+            job.service = service
+            for task, other in attempts.items():
+                if other is not service:
+                    task.cancel()
+
+        def launch(suffix: str):
+            service = None
+            streamed = False
+
+            def on_text(text: str, reset: bool):
+                nonlocal streamed
+                # An empty reset (a remote host was lost before the retry) is not a first text
+                if text and not streamed:
+                    streamed = True
+                    hedge_policy.observe_first_text(time.time() - run_started)
+                    if winner is None:
+                        choose(service)
+                if winner is service:
+                    job.on_text(text, reset)
+
+            service = self._new_service(job.request_id + suffix, on_text)
+            if job.service is None:
+                job.service = service
+            task = asyncio.create_task(service.process_request(job.request))
+            attempts[task] = service
+            return task
+
+        primary = attempts[launch("")]
+        try:
+            await asyncio.wait(set(attempts), timeout=hedge_policy.delay())
+            if winner is None and not any(task.done() for task in attempts):
+                if not self._spare_capacity():
+                    hedge_policy.skipped_capacity += 1
+                elif hedge_policy.take():
+                    logger.info("Hedging request %s after %.1fs without text", job.request_id, hedge_policy.delay(), extra={"request_id": job.request_id})
+                    metrics.hedges.inc("launched")
+                    # The hedge holds a browser slot like any running job
+                    self.running += 1
+                    launch("-hedge").add_done_callback(lambda _: setattr(self, "running", self.running - 1))
+
+            result = None
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    service = attempts[task]
+                    outcome = task.result()
+                    if winner is None and outcome.failure_reason == FailureReason.SUCCESS_FULL:
+                        choose(service)
+                    if winner is None or winner is service:
+                        # A failed attempt only answers the job if the other one fails too
+                        result = outcome.model_copy(update={"request_id": job.request_id, "latency_ms": int((time.time() - run_started) * 1000)})
+
+            if len(attempts) > 1 and winner is not None:
+                if winner is primary:
+                    hedge_policy.lost += 1
+                    metrics.hedges.inc("lost")
+                else:
+                    hedge_policy.won += 1
+                    metrics.hedges.inc("won")
+            if result is None:
+                # Every attempt was cancelled
+                raise asyncio.CancelledError()
+            return result
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
 
     async def _worker_loop(self):
         logger.info("Worker loop started")
         while True:
+            self.idle_workers += 1
             try:
-                request, request_id, future = await self.queue.get()
-                
-                logger.info(f"Processing request {request_id}", extra={"request_id": request_id})
-                
-                service = BrowserService(request_id)
-                try:
-                    result = await service.process_request(request)
-                    future.set_result(result)
-                except Exception as e:
-                    logger.error(f"Worker unhandled exception processing {request_id}: {e}")
-                    # Ensure future is set even on crash
-                    if not future.done():
-                        future.set_result(GenerateResponse(
-                            request_id=request_id,
-                            status=TaskStatus.FAILED,
-                            failure_reason=FailureReason.FAIL_UNKNOWN,
-                            output_text=str(e),
-                            latency_ms=0
-                        ))
+                _, _, job = await asyncio.wait_for(self.queue.get(), timeout=config.WORKER_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if self.active_workers > self.min_workers:
+                    # Leave the worker set now, not in the done callback, so workers timing out together see the new count
+                    self.workers.discard(asyncio.current_task())
+                    logger.info("Worker loop stopping (idle)", extra={"worker_count": self.active_workers})
+                    return
+                continue
+            finally:
+                self.idle_workers -= 1
+
+            try:
+                self.queued_priorities[job.priority] -= 1
+                request_id = job.request_id
+                alpha = config.ADMISSION_SERVICE_TIME_ALPHA
+                self.queue_wait = (1 - alpha) * self.queue_wait + alpha * (time.time() - job.enqueued_at)
+
+                if job.future.done():
+                    # Cancelled while queued, e.g. the client went away
+                    logger.info("Skipping cancelled request %s", request_id, extra={"request_id": request_id})
+                else:
+                    await self._process(job)
 
                 self.queue.task_done()
-                
+
             except Exception as e:
-                logger.error(f"Worker loop exception: {e}")
-            
-            # Check if we should exit 
-            # We strictly exit if queue is empty to respect resource usage, 
-            # but we need to be careful about race conditions with enqueue.
-            # actually, if we want to keep workers around for a bit we could, but let's be strict for now.
-            
-            if self.queue.empty():
-                 async with self.lock:
-                    if self.queue.empty():
-                        self.active_workers -= 1
-                        logger.info("Worker loop stopping (queue empty)", extra={"worker_count": self.active_workers})
-                        return
-
-queue_manager = QueueManager(config.MAX_CONCURRENT_BROWSERS if 'config' in globals() else 2) # dependency injection later
+                logger.error("Worker loop exception: %s", e)
+
+            if self.active_workers > self.max_allowed:
+                self.workers.discard(asyncio.current_task())
+                logger.info("Worker loop stopping (over memory limit)", extra={"worker_count": self.active_workers})
+                return
+
+    async def _supervisor_loop(self):
+        while True:
+            await asyncio.sleep(config.WORKER_SUPERVISOR_INTERVAL)
+            try:
+                available = await asyncio.to_thread(host_memory_available_fraction)
+                if available < config.MEMORY_PRESSURE_MIN_AVAILABLE and self.max_allowed > self.min_workers:
+                    self.max_allowed -= 1
+                    logger.warning("Memory pressure, shedding a worker", extra={"props": {"available": round(available, 3), "max_workers": self.max_allowed}})
+                elif available > 2 * config.MEMORY_PRESSURE_MIN_AVAILABLE and self.max_allowed < self.max_concurrent:
+                    self.max_allowed += 1
+                    logger.info("Memory recovered, restoring a worker", extra={"props": {"available": round(available, 3), "max_workers": self.max_allowed}})
+                # Hot pages hold most of the memory, so the page pool follows the worker limit
+                await page_pool.resize(self.max_allowed)
+
+                while self.active_workers < self.min_workers:
+                    self._spawn_worker()
+
+                rising = self.queue_wait > self._last_queue_wait
+                self._last_queue_wait = self.queue_wait
+                backlog = self.queue.qsize() > self.idle_workers
+                slow = rising and self.queue_wait > config.WORKER_SCALE_UP_WAIT and not self.queue.empty()
+                if (backlog or slow) and self.active_workers < self.max_allowed:
+                    self._spawn_worker()
+            except Exception as e:
+                logger.error("Worker supervisor error: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "queue_size": self.queue.qsize(),
+            "running": self.running,
+            "service_time_s": round(self.service_time, 2),
+            "estimated_wait_s": round(self.estimate_wait(), 2),
+            "workers": self.active_workers,
+            "idle_workers": self.idle_workers,
+            "max_workers": self.max_allowed,
+            "queue_wait_s": round(self.queue_wait, 2),
+        }
+
+queue_manager = QueueManager(config.TOTAL_CONCURRENT_CONTEXTS if 'config' in globals() else 2) # dependency injection later
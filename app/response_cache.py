@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.config import config
+from app.models import GenerateResponse
+from app.logger import logger
+from app.metrics import metrics
+
+def prompt_key(prompt: str) -> str:
+    """Hash of the prompt with whitespace normalized, so trivially different prompts share an entry."""
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    LRU cache of successful responses with a TTL. When a disk path is configured,
+    entries are also written to SQLite so they survive restarts; disk I/O runs
+    in a worker thread to keep it off the event loop.
+    """
+    def __init__(self, max_entries: int = config.CACHE_MAX_ENTRIES, ttl: int = config.CACHE_TTL, disk_path: str = config.CACHE_DISK_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.entries: "OrderedDict[str, Tuple[float, GenerateResponse]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._puts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created_at REAL, response TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._db_lock:
+            row = self._connect().execute("SELECT created_at, response FROM responses WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def _disk_put(self, key: str, created_at: float, payload: str, trim: bool):
+        with self._db_lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, created_at, payload))
+            db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+            if trim:
+                db.execute(
+                    "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+                    (config.CACHE_DISK_MAX_ENTRIES,)
+                )
+            db.commit()
+
+    def _remember(self, key: str, created_at: float, response: GenerateResponse):
+        self.entries[key] = (created_at, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[GenerateResponse]:
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry:
+            created_at, response = entry
+            if now - created_at <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.cache_hits.inc()
+                return response
+            del self.entries[key]
+
+        if self.disk_path:
+            try:
+                row = await asyncio.to_thread(self._disk_get, key)
+            except Exception as e:
+                logger.error("Response cache disk read failed: %s", e)
+                row = None
+            if row and now - row[0] <= self.ttl:
+                response = GenerateResponse.model_validate_json(row[1])
+                self._remember(key, row[0], response)
+                self.hits += 1
+                metrics.cache_hits.inc()
+                return response
+
+        self.misses += 1
+        metrics.cache_misses.inc()
+        return None
+
+    async def put(self, key: str, response: GenerateResponse):
+        created_at = time.time()
+        self._remember(key, created_at, response)
+        if self.disk_path:
+            self._puts += 1
+            try:
+                await asyncio.to_thread(self._disk_put, key, created_at, response.model_dump_json(), self._puts % 100 == 0)
+            except Exception as e:
+                logger.error("Response cache disk write failed: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+response_cache = ResponseCache()
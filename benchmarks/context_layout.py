@@ -0,0 +1,105 @@
+"""
+Compares browser/context layouts, e.g. one browser with eight contexts (1x8)
+against eight browsers with one context each (8x1).
+
+Reports memory per concurrent context and page throughput for each layout.
+
+    python -m benchmarks.context_layout --layouts 1x8,8x1 --rounds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from playwright.async_api import async_playwright
+from app.browser_pool import BROWSER_ARGS
+from app.page_pool import CONTEXT_OPTIONS
+from app.memory import process_tree_memory
+
+# A page with enough DOM and script work to resemble a chat transcript
+SYNTHETIC_PAGE = """
+<html><body>
+<div id="log"></div>
+<script>
+  const log = document.getElementById("log");
+  for (let i = 0; i < 2000; i++) {
+    const p = document.createElement("p");
+    p.className = "markdown";
+    p.textContent = "message " + i + " " + "lorem ipsum ".repeat(8);
+    log.appendChild(p);
+  }
+</script>
+</body></html>
+"""
+
+WORK_SCRIPT = """
+() => {
+  const p = document.createElement("p");
+  p.textContent = "x".repeat(1000);
+  document.getElementById("log").appendChild(p);
+  return document.querySelectorAll(".markdown").length;
+}
+"""
+
+async def run_layout(browsers: int, contexts: int, rounds: int, url: str) -> dict:
+    async with async_playwright() as playwright:
+        baseline = process_tree_memory(os.getpid())
+
+        launched = [await playwright.chromium.launch(headless=True, args=BROWSER_ARGS) for _ in range(browsers)]
+        pages = []
+        for browser in launched:
+            for _ in range(contexts):
+                context = await browser.new_context(**CONTEXT_OPTIONS)
+                page = await context.new_page()
+                if url:
+                    await page.goto(url)
+                else:
+                    await page.set_content(SYNTHETIC_PAGE)
+                pages.append(page)
+
+        # Let renderers settle before sampling memory
+        await asyncio.sleep(2)
+        memory = process_tree_memory(os.getpid()) - baseline
+
+        async def drive(page):
+            for _ in range(rounds):
+                await page.set_content(SYNTHETIC_PAGE)
+                await page.evaluate(WORK_SCRIPT)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(drive(page) for page in pages))
+        elapsed = time.perf_counter() - start
+
+        for browser in launched:
+            await browser.close()
+
+    concurrent = browsers * contexts
+    return {
+        "layout": f"{browsers}x{contexts}",
+        "concurrent_contexts": concurrent,
+        "memory_mb": round(memory / 2**20, 1),
+        "memory_per_context_mb": round(memory / 2**20 / concurrent, 1),
+        "page_loads_per_s": round(concurrent * rounds / elapsed, 2),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layouts", default="1x8,8x1", help="Comma separated BROWSERSxCONTEXTS layouts")
+    parser.add_argument("--rounds", type=int, default=20, help="Page loads per context for the throughput run")
+    parser.add_argument("--url", default="", help="Load this URL instead of the synthetic page")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for layout in args.layouts.split(","):
+        browsers, contexts = (int(n) for n in layout.lower().split("x"))
+        result = await run_layout(browsers, contexts, args.rounds, args.url)
+        print(json.dumps(result))
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
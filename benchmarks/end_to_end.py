@@ -0,0 +1,159 @@
+"""
+End-to-end latency and throughput benchmark. Starts the mock chat and the API
+(pointed at it through CHAT_URL), sends streaming requests at each concurrency
+level and reports p50/p95/p99 latency, time-to-first-token and throughput.
+
+    python -m benchmarks.end_to_end --concurrency 1,2,4 --requests 20 --output baseline.json
+    python -m benchmarks.end_to_end --baseline baseline.json   # compare against an earlier run
+
+Pass --server to benchmark an already running API instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from collections import Counter
+from typing import List, Optional
+from benchmarks import mock_chat
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+def stream_request(server: str, prompt: str, timeout: float) -> dict:
+    """Sends one /generate/stream request; returns latency, TTFT and outcome."""
+    payload = json.dumps({"prompt": prompt, "cache": "bypass"}).encode("utf-8")
+    request = urllib.request.Request(f"{server}/generate/stream", data=payload, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    ttft = None
+    event = None
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            for raw in response:
+                line = raw.decode("utf-8").rstrip("\n")
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    if event in ("chunk", "reset") and ttft is None:
+                        ttft = (time.perf_counter() - start) * 1000
+                    elif event == "done":
+                        result = json.loads(line[len("data: "):])
+                        return {
+                            "latency_ms": (time.perf_counter() - start) * 1000,
+                            "ttft_ms": ttft,
+                            "outcome": result.get("failure_reason") or result.get("status"),
+                        }
+    except Exception as e:
+        return {"latency_ms": (time.perf_counter() - start) * 1000, "ttft_ms": ttft, "outcome": f"client_error:{type(e).__name__}"}
+    return {"latency_ms": (time.perf_counter() - start) * 1000, "ttft_ms": ttft, "outcome": "client_error:no_done_event"}
+
+async def run_level(server: str, concurrency: int, requests: int, timeout: float) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int) -> dict:
+        async with semaphore:
+            # Unique prompts so neither the cache nor request coalescing answers them
+            prompt = f"benchmark {uuid.uuid4()} #{index}"
+            return await asyncio.to_thread(stream_request, server, prompt, timeout)
+
+    start = time.perf_counter()
+    samples = await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    ok = [s for s in samples if s["outcome"] == "SUCCESS_FULL"]
+    latencies = [s["latency_ms"] for s in ok]
+    ttfts = [s["ttft_ms"] for s in ok if s["ttft_ms"] is not None]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "succeeded": len(ok),
+        "outcomes": dict(Counter(s["outcome"] for s in samples)),
+        "throughput_rps": round(len(ok) / elapsed, 3),
+        "latency_p50_ms": percentile(latencies, 0.50),
+        "latency_p95_ms": percentile(latencies, 0.95),
+        "latency_p99_ms": percentile(latencies, 0.99),
+        "ttft_p50_ms": percentile(ttfts, 0.50),
+        "ttft_p95_ms": percentile(ttfts, 0.95),
+        "ttft_p99_ms": percentile(ttfts, 0.99),
+    }
+
+def wait_for_server(server: str, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{server}/health", timeout=2) as response:
+                health = json.loads(response.read())
+                if health.get("hot_pages") or health["browser_pool"].get("hosts"):
+                    return
+        except Exception:
+            pass
+        time.sleep(1)
+    raise RuntimeError(f"API at {server} did not become ready within {timeout:.0f}s")
+
+def compare(results: List[dict], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {level["concurrency"]: level for level in json.load(f)["levels"]}
+    for level in results:
+        before = baseline.get(level["concurrency"])
+        if not before:
+            continue
+        delta = {"concurrency": level["concurrency"]}
+        for key in ("throughput_rps", "latency_p50_ms", "latency_p95_ms", "ttft_p95_ms"):
+            if before.get(key) and level.get(key) is not None:
+                delta[f"{key}_change_pct"] = round((level[key] - before[key]) / before[key] * 100, 1)
+        print(json.dumps(delta))
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,2,4", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request client timeout (seconds)")
+    parser.add_argument("--server", help="Benchmark this running API instead of starting one")
+    parser.add_argument("--api-port", type=int, default=8001)
+    parser.add_argument("--mock-port", type=int, default=8100)
+    parser.add_argument("--output", help="Write results as a JSON baseline to this file")
+    parser.add_argument("--baseline", help="Print changes relative to this earlier --output file")
+    mock_chat.add_arguments(parser)
+    args = parser.parse_args()
+
+    api = None
+    mock = None
+    server = args.server
+    if not server:
+        mock = mock_chat.serve(args, port=args.mock_port)
+        server = f"http://127.0.0.1:{args.api_port}"
+        env = {**os.environ, "CHAT_URL": f"http://127.0.0.1:{args.mock_port}/", "CACHE_DISK_PATH": ""}
+        api = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.api_port)],
+            env=env, stdout=subprocess.DEVNULL
+        )
+
+    try:
+        wait_for_server(server, timeout=120)
+        results = []
+        for concurrency in (int(level) for level in args.concurrency.split(",")):
+            result = await run_level(server, concurrency, args.requests, args.timeout)
+            print(json.dumps(result))
+            results.append(result)
+    finally:
+        if api:
+            api.terminate()
+            api.wait()
+        if mock:
+            mock.shutdown()
+
+    if args.baseline:
+        compare(results, args.baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"created_at": time.time(), "args": vars(args), "levels": results}, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
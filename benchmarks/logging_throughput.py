@@ -0,0 +1,125 @@
+"""
+Compares the synchronous logging setup (JSON formatted and written on the
+calling thread) with the queued pipeline from app.logger, writing to a sink
+that simulates a slow stdout consumer.
+
+Reports caller-side throughput and event-loop lag while a task logs, plus the
+cost of filtered-out debug calls with eager f-strings versus lazy %-arguments.
+
+    python -m benchmarks.logging_throughput --messages 20000 --write-delay-us 50
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import logging.handlers
+import queue
+import statistics
+import time
+from app.logger import JSONFormatter, DeferredQueueHandler
+
+class SlowStream(io.TextIOBase):
+    """Discards output after blocking for a while per write, like a pipe to a slow collector."""
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        # Sleeping releases the GIL, as a blocking write to a full pipe does
+        time.sleep(self.delay)
+        return len(text)
+
+def build_logger(mode: str, stream: SlowStream):
+    logger = logging.getLogger(f"bench_{mode}")
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JSONFormatter())
+    listener = None
+    if mode == "queued":
+        listener = logging.handlers.QueueListener(queue.SimpleQueue(), handler)
+        listener.start()
+        handler = DeferredQueueHandler(listener.queue)
+    logger.addHandler(handler)
+    return logger, listener
+
+async def run_mode(mode: str, messages: int, delay: float) -> dict:
+    logger, listener = build_logger(mode, SlowStream(delay))
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        interval = 0.001
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - start - interval)
+
+    async def produce():
+        for i in range(messages):
+            logger.info("Processing request %s", i, extra={"request_id": f"bench-{i}", "props": {"attempt": 1}})
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+
+    tick_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await produce()
+    caller_elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    if listener:
+        # Drain the queue so the next mode starts from a quiet sink
+        listener.stop()
+    drained_elapsed = time.perf_counter() - start
+
+    lags.sort()
+    return {
+        "mode": mode,
+        "messages": messages,
+        "caller_msgs_per_s": round(messages / caller_elapsed),
+        "drained_s": round(drained_elapsed, 3),
+        "loop_lag_p50_ms": round(statistics.median(lags) * 1000, 3) if lags else None,
+        "loop_lag_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 3) if lags else None,
+        "loop_lag_max_ms": round(lags[-1] * 1000, 3) if lags else None,
+    }
+
+def filtered_cost(calls: int) -> dict:
+    logger = logging.getLogger("bench_filtered")
+    logger.setLevel(logging.INFO)
+    payload = {"prompt_area": "<Locator selector='#prompt-textarea'>"}
+
+    start = time.perf_counter()
+    for i in range(calls):
+        logger.debug(f"Entering prompt into {payload} ({i})")
+    eager = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(calls):
+        logger.debug("Entering prompt into %s (%s)", payload, i)
+    lazy = time.perf_counter() - start
+
+    return {"filtered_calls": calls, "eager_ns_per_call": round(eager / calls * 1e9), "lazy_ns_per_call": round(lazy / calls * 1e9)}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000, help="Log records per mode")
+    parser.add_argument("--write-delay-us", type=float, default=50, help="Simulated cost of each write to stdout")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for mode in ("sync", "queued"):
+        result = await run_mode(mode, args.messages, args.write_delay_us / 1e6)
+        print(json.dumps(result))
+        results.append(result)
+    result = filtered_cost(args.messages)
+    print(json.dumps(result))
+    results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,172 @@
+"""
+Local stand-in for the chat page, for benchmarks and regression runs without
+hitting the real site. It has the same prompt textarea, send and stop buttons
+and streamed `.markdown` answers; token rate and failure modes are set on the
+command line.
+
+    python -m benchmarks.mock_chat --port 8100 --tokens-per-s 40
+    CHAT_URL=http://127.0.0.1:8100/ uvicorn app.main:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>ChatGPT</title>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  #thread { padding: 16px 16px 120px; }
+  #composer { position: fixed; bottom: 0; left: 0; right: 0; padding: 16px; background: #fff; display: flex; gap: 8px; }
+  #prompt-textarea { flex: 1; height: 48px; overflow: auto; border: 1px solid #ccc; }
+  .overlay { position: fixed; inset: 0; background: rgba(0,0,0,.5); display: flex; align-items: center; justify-content: center; }
+  .overlay > div { background: #fff; padding: 24px; }
+</style></head>
+<body>
+<nav><button data-testid="create-new-chat-button">New chat</button></nav>
+<div id="thread"></div>
+<div id="composer">
+  __EDITOR__
+  <button data-testid="send-button" aria-label="Send prompt" disabled>Send</button>
+  <button data-testid="stop-button" aria-label="Stop generating" style="display:none">Stop</button>
+</div>
+<script>
+const CONFIG = __CONFIG__;
+const thread = document.getElementById('thread');
+const textarea = document.getElementById('prompt-textarea');
+const send = document.querySelector("[data-testid='send-button']");
+const stop = document.querySelector("[data-testid='stop-button']");
+const WORDS = 'the quick brown fox jumps over a lazy dog while streaming tokens arrive one by one'.split(' ');
+
+function overlay(html) {
+  const el = document.createElement('div');
+  el.className = 'overlay';
+  el.innerHTML = '<div>' + html + '</div>';
+  document.body.appendChild(el);
+  return el;
+}
+
+if (Math.random() < CONFIG.popup_rate) {
+  const popup = overlay('<p>Thanks for trying ChatGPT</p><div id="stay-out" style="cursor:pointer">Stay logged out</div>');
+  popup.querySelector('#stay-out').addEventListener('click', () => popup.remove());
+}
+
+// A textarea, or a contenteditable div like the real page's rich editor
+const promptText = () => textarea.value !== undefined ? textarea.value : textarea.innerText;
+const clearPrompt = () => { if (textarea.value !== undefined) textarea.value = ''; else textarea.textContent = ''; };
+
+textarea.addEventListener('input', () => { send.disabled = !promptText().trim(); });
+
+// Clears the thread without a reload, like the real page's client-side routing
+document.querySelector("[data-testid='create-new-chat-button']").addEventListener('click', () => {
+  thread.innerHTML = '';
+  stop.style.display = 'none';
+  send.style.display = '';
+});
+
+function submit() {
+  const prompt = promptText().trim();
+  if (!prompt) return;
+  clearPrompt();
+  send.disabled = true;
+
+  const user = document.createElement('div');
+  user.className = 'whitespace-pre-wrap';
+  user.textContent = prompt;
+  thread.appendChild(user);
+
+  if (Math.random() < CONFIG.signup_modal_rate) { overlay('<div>Sign up to chat</div>'); return; }
+  if (Math.random() < CONFIG.no_start_rate) return;
+
+  send.style.display = 'none';
+  stop.style.display = '';
+  const answer = document.createElement('div');
+  answer.className = 'markdown';
+  setTimeout(() => {
+    thread.appendChild(answer);
+    const stallAt = Math.random() < CONFIG.stall_rate ? Math.floor(CONFIG.answer_tokens / 2) : -1;
+    let i = 0;
+    const timer = setInterval(() => {
+      if (i === stallAt) { clearInterval(timer); return; }
+      answer.textContent += (i ? ' ' : '') + WORDS[i % WORDS.length];
+      if (++i >= CONFIG.answer_tokens) {
+        clearInterval(timer);
+        stop.style.display = 'none';
+        send.style.display = '';
+      }
+    }, 1000 / CONFIG.tokens_per_s);
+  }, CONFIG.first_token_ms);
+}
+
+send.addEventListener('click', submit);
+textarea.addEventListener('keydown', (e) => { if (e.key === 'Enter' && !e.shiftKey) { e.preventDefault(); submit(); } });
+</script>
+</body></html>
+"""
+
+EDITORS = {
+    "textarea": '<textarea id="prompt-textarea" placeholder="Message ChatGPT"></textarea>',
+    "contenteditable": '<div id="prompt-textarea" contenteditable="true"></div>',
+}
+
+def make_handler(page_config: dict, load_delay: float, editor: str = "textarea"):
+    body = PAGE.replace("__CONFIG__", json.dumps(page_config)).replace("__EDITOR__", EDITORS[editor]).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if load_delay:
+                time.sleep(load_delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--tokens-per-s", type=float, default=40, help="Streaming rate of the answer")
+    parser.add_argument("--answer-tokens", type=int, default=60, help="Words per answer")
+    parser.add_argument("--first-token-ms", type=int, default=300, help="Delay between send and the first token")
+    parser.add_argument("--load-delay-ms", type=int, default=0, help="Server delay before serving the page")
+    parser.add_argument("--popup-rate", type=float, default=0.0, help="Fraction of loads showing the 'Stay logged out' popup")
+    parser.add_argument("--signup-modal-rate", type=float, default=0.0, help="Fraction of prompts blocked by 'Sign up to chat'")
+    parser.add_argument("--no-start-rate", type=float, default=0.0, help="Fraction of prompts that never start generating")
+    parser.add_argument("--editor", choices=sorted(EDITORS), default="textarea", help="Kind of prompt box")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of answers that stop halfway with the stop button still shown")
+
+def serve(args: argparse.Namespace, host: str = "127.0.0.1", port: int = 8100) -> ThreadingHTTPServer:
+    """Starts the mock chat in a background thread and returns the server."""
+    page_config = {
+        "tokens_per_s": args.tokens_per_s,
+        "answer_tokens": args.answer_tokens,
+        "first_token_ms": args.first_token_ms,
+        "popup_rate": args.popup_rate,
+        "signup_modal_rate": args.signup_modal_rate,
+        "no_start_rate": args.no_start_rate,
+        "stall_rate": args.stall_rate,
+    }
+    server = ThreadingHTTPServer((host, port), make_handler(page_config, args.load_delay_ms / 1000, args.editor))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = serve(args, args.host, args.port)
+    print(f"Mock chat listening on http://{args.host}:{args.port}/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
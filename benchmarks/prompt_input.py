@@ -0,0 +1,110 @@
+"""
+Prompt input time against prompt size for each input method in
+app.prompt_input, on the mock chat's textarea and contenteditable prompt box.
+Each sample is the time from starting the input until the send button is
+enabled, which is what a request waits for before sending.
+
+    python -m benchmarks.prompt_input --sizes-kb 1,10,50,100 --repeats 3
+
+Key-by-key typing (`type`, the previous fallback) is only measured up to
+--type-max-kb because it takes minutes for larger prompts.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from playwright.async_api import async_playwright
+from app.prompt_input import INPUT_METHODS, CLEAR_SCRIPT, entered_length
+from app.page_probe import wait_send_enabled
+from benchmarks import mock_chat
+
+WORDS = "the quick brown fox jumps over a lazy dog while streaming tokens arrive one by one".split()
+
+def make_prompt(size: int) -> str:
+    """Roughly `size` characters of text in 80-character lines."""
+    lines = []
+    length = 0
+    index = 0
+    while length < size:
+        line = " ".join(WORDS[(index + i) % len(WORDS)] for i in range(14))[:80]
+        lines.append(line)
+        length += len(line) + 1
+        index += 1
+    return "\n".join(lines)[:size]
+
+async def measure(page, method: str, prompt: str) -> dict:
+    prompt_area = page.locator("#prompt-textarea").first
+    await prompt_area.evaluate(CLEAR_SCRIPT)
+    start = time.perf_counter()
+    error = None
+    try:
+        await INPUT_METHODS[method](page, prompt_area, prompt)
+        enabled = await wait_send_enabled(page, 10)
+    except Exception as e:
+        enabled = False
+        error = type(e).__name__
+    elapsed = (time.perf_counter() - start) * 1000
+    entered = await entered_length(prompt_area)
+    return {"ms": elapsed, "entered": entered, "send_enabled": enabled, "error": error}
+
+async def run_editor(browser, editor: str, url: str, sizes_kb, repeats: int, type_max_kb: float) -> list:
+    context = await browser.new_context()
+    page = await context.new_page()
+    await page.goto(url)
+    results = []
+    for size_kb in sizes_kb:
+        prompt = make_prompt(int(size_kb * 1024))
+        for method in INPUT_METHODS:
+            if method == "type" and size_kb > type_max_kb:
+                continue
+            samples = [await measure(page, method, prompt) for _ in range(repeats)]
+            times = [s["ms"] for s in samples]
+            result = {
+                "editor": editor,
+                "size_kb": size_kb,
+                "method": method,
+                "median_ms": round(statistics.median(times), 1),
+                "max_ms": round(max(times), 1),
+                "entered_chars": samples[-1]["entered"],
+                "send_enabled": all(s["send_enabled"] for s in samples),
+                "errors": [s["error"] for s in samples if s["error"]],
+            }
+            print(json.dumps(result))
+            results.append(result)
+    await context.close()
+    return results
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-kb", default="1,5,10,25,50,100", help="Comma separated prompt sizes")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--type-max-kb", type=float, default=2, help="Largest prompt measured with key-by-key typing")
+    parser.add_argument("--editors", default="textarea,contenteditable")
+    parser.add_argument("--mock-port", type=int, default=8101)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    sizes_kb = [float(size) for size in args.sizes_kb.split(",")]
+
+    results = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        for offset, editor in enumerate(args.editors.split(",")):
+            mock_args = argparse.Namespace(
+                tokens_per_s=40, answer_tokens=10, first_token_ms=0, load_delay_ms=0, popup_rate=0.0,
+                signup_modal_rate=0.0, no_start_rate=0.0, stall_rate=0.0, editor=editor
+            )
+            port = args.mock_port + offset
+            server = mock_chat.serve(mock_args, port=port)
+            try:
+                results += await run_editor(browser, editor, f"http://127.0.0.1:{port}/", sizes_kb, args.repeats, args.type_max_kb)
+            finally:
+                server.shutdown()
+        await browser.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())